@@ -0,0 +1,101 @@
+import hashlib
+import json
+
+from fastapi import HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.status import HTTP_304_NOT_MODIFIED, HTTP_400_BAD_REQUEST
+
+from app.core.config import settings
+from app.repositories.listing import list_rows, list_version
+
+
+class ListParams:
+    """Query parameters shared by the catalog list endpoints."""
+
+    def __init__(
+        self,
+        limit: int | None = Query(None, ge=1, le=settings.CATALOG_PAGE_MAX_LIMIT),
+        after_id: int | None = Query(None, ge=0),
+        fields: str | None = Query(
+            None, description="Comma separated fields to return, e.g. id,title"
+        ),
+    ):
+        self.limit = limit
+        self.after_id = after_id
+        self.fields = (
+            sorted({field.strip() for field in fields.split(",") if field.strip()})
+            if fields
+            else None
+        )
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+
+
+async def list_catalog(
+    request: Request,
+    params: ListParams,
+    db: AsyncSession,
+    model,
+    schema: type[BaseModel],
+):
+    """Page of active rows of model with an ETag, 304 when it still matches.
+
+    The ETag covers the whole table (row count, last update and last delete)
+    plus the parameters, so it is computed before loading any row.
+    """
+    if params.fields is not None:
+        unknown = set(params.fields) - set(schema.model_fields)
+        if unknown:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+
+    version = await list_version(db, model)
+    digest = hashlib.sha256(
+        json.dumps(
+            [
+                model.__tablename__,
+                *map(str, version),
+                params.limit,
+                params.after_id,
+                params.fields,
+            ]
+        ).encode()
+    ).hexdigest()
+    headers = {"ETag": f'W/"{digest[:32]}"', "Cache-Control": "no-cache"}
+
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+
+    columns = None
+    if params.fields is not None:
+        # The id is always loaded, it is the cursor of the next page
+        columns = sorted({"id", *params.fields})
+
+    rows = await list_rows(db, model, params.limit, params.after_id, columns)
+
+    if params.limit is not None and len(rows) == params.limit:
+        headers["X-Next-After-Id"] = str(rows[-1].id)
+
+    if params.fields is None:
+        content = [
+            schema.model_validate(row, from_attributes=True).model_dump(mode="json")
+            for row in rows
+        ]
+    else:
+        content = jsonable_encoder(
+            [{field: getattr(row, field) for field in params.fields} for row in rows]
+        )
+
+    return JSONResponse(content=content, headers=headers)
@@ -1,314 +1,193 @@
+import asyncio
+import datetime
 import json
-from openai import OpenAI
-import gitlab
-from cerebras.cloud.sdk import Cerebras
+import uuid
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.status import (
     HTTP_200_OK,
-    HTTP_400_BAD_REQUEST,
-    HTTP_401_UNAUTHORIZED,
+    HTTP_202_ACCEPTED,
     HTTP_404_NOT_FOUND,
     HTTP_500_INTERNAL_SERVER_ERROR,
 )
 from app.core.config import settings
-from app.db.session import get_db
+from app.db.session import SessionLocal, get_db
 
-from app.models.ai_providers import ProvidersTypes
 from app.schemas.merge_request import (
     CreatedMergeRequestResponse,
+    MergeRequestBatchInput,
     MergeRequestDataAiInput,
     MergeRequestInfoResponse,
     MergeRequestInput,
+    MergeRequestJobResponse,
 )
+from app.repositories import generation_jobs
 
-from app.repositories import templates, providers, models
-
+from app.services.generation import (
+    get_generation_context,
+    get_gitlab_project,
+    run_generation,
+    stream_generation,
+)
+from app.services.gitlab_gateway import GitlabError, gitlab_sessions
+from app.services.job_worker import seal_job_payload
+from app.services.llm_scheduler import PRIORITY_BATCH, llm_priority
 
 router_merge = APIRouter(prefix="/merge-request")
 
 
-def process_with_open_router(model: str, messages: []):
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=settings.OPEN_ROUTER_API_KEY,
-    )
-
-    llm_response = client.chat.completions.create(model=model, messages=messages)
-
-    return llm_response
-
-
-def process_with_cerebras(model: str, messages: []):
-    client = Cerebras(api_key=settings.CEREBRAS_API_KEY)
-
-    llm_response = client.chat.completions.create(
-        messages=messages,
-        model=model,
-    )
-
-    return llm_response
-
-
-def get_ai_mr_data(
-    diffs: str,
-    template: str,
-    title: str,
-    user_context: str,
-    provider_type: ProvidersTypes,
-    model: str,
+@router_merge.post("", response_model=MergeRequestInfoResponse)
+async def generate_merge_request_data(
+    merge_request_input: MergeRequestDataAiInput, db: AsyncSession = Depends(get_db)
 ):
-    system_prompt = f"""
-        You are an assistant that writes GitLab Merge Request (MR) titles and descriptions based on provided information.
-        You must not make network calls, execute tools, or include anything outside the strict output format.
-        Your only goal is to generate a professional, concise, and accurate MR title and description, following a provided template.
-
-        Inputs Provided:
-        - PROJECT_CONTEXT: A short description of what this project does.
-        - DIFF_TEXT: The complete unified diff of all changes between the feature branch and target branch .
-        - TITLE_TEMPLATE: A short string template for the MR title.
-        - DESCRIPTION_TEMPLATE: A Markdown template for the MR description body .
-        - USER_NOTES: Optional human-written notes that provide context, intent, or goals for this MR.
-
-        Output Contract (Strict):
-        Return only the following two sections. Any text outside these tags will be ignored and considered an error.
-
-        [title:start]
-        <one line MR title>
-        [title:end]
-        [description:start]
-        <Markdown-formatted MR description>
-        [description:end]
-
-        Rules:
-        - Do not add anything before, between, or after these tags.
-        - The title must fit in one line (max 120 characters, no trailing period).
-        - The description must be valid Markdown that GitLab will render properly.
-        - If any information is missing, insert a 'TODO:' note (e.g., 'TODO: Add Jira ticket link').
-
-        Behavior Rules:
-        1. Understand what changed:
-        - Use the DIFF_TEXT to infer what files, features, or behaviors changed.
-        - Focus on what the developer changed, why, and potential effects.
-
-        2. Use templates correctly:
-        - Replace placeholders like {{what_changed}}, {{why}}, {{impact}}, etc. with real information.
-        - If the template doesn’t include placeholders, fill it naturally with what fits.
-
-        3. Writing style:
-        - Professional and concise.
-        - Neutral tone (avoid 'I' or 'we').
-        - Use short sentences and bullet points for clarity.
-        - Use Markdown headers (##) for sections.
-        - If code snippets are useful, use fenced code blocks.
-
-        4. Sections (if not provided in template):
-        ## What changed
-        {{what_changed}}
-
-        ## Why
-        {{why}}
-
-        ## Implementation details
-        {{implementation}}
-
-        ## Risks / Breaking changes
-        {{risks}}
-
-        ## Testing
-        {{testing}}
-
-        ## Rollback plan
-        {{rollback}}
-
-        ## Links
-        {{links}}
-
-        5. Accuracy:
-        - Never invent code, issue numbers, or links that don’t exist.
-        - Use TODO if the data isn’t in context.
-        - Summarize diffs — don’t paste large code blocks.
-
-        6. Token discipline:
-        - Prioritize 'What changed', 'Why', 'Testing', and 'Risks' sections if output must be truncated.
-        - Keep total output concise (usually under 1000 tokens).
-
-        Example Output:
-        [title:start]
-        feat(giftcards): add API endpoints and validation for gift card creation
-        [title:end]
-        [description:start]
-        ## What changed
-        - Added POST /api/giftcards endpoint for issuing new cards.
-        - Implemented validation logic for card amount and expiration.
-        - Updated GiftCardService and related unit tests.
-
-        ## Why
-        To support gift card creation for upcoming promo campaigns.
-
-        ## Risks / Breaking changes
-        - New validation could block some edge cases if amount/expiry are misconfigured.
-
-        ## Testing
-        - Added unit tests in tests/services/test_giftcards.py.
-        - Verified 200/400 responses with mock data.
-
-        ## Rollback plan
-        Revert the new service class or disable the /api/giftcards route.
-
-        ## Links
-        TODO: Add Jira or issue link.
-        [description:end]
-    """
+    provider, model, template = await get_generation_context(db, merge_request_input)
 
-    user_message = f"""
-        PROJECT_CONTEXT:
-        {user_context or 'TODO: No project context provided.'}
+    return await run_generation(db, merge_request_input, provider, model, template)
 
-        DIFF_TEXT:
-        {diffs}
 
-        TITLE_TEMPLATE:
-        {title}
+@router_merge.post("/batch")
+async def generate_merge_request_data_batch(
+    batch_input: MergeRequestBatchInput, db: AsyncSession = Depends(get_db)
+):
+    """Generate the data of many merge requests, streamed back as NDJSON.
 
-        DESCRIPTION_TEMPLATE:
-        {template}
+    Every line is the result of one item, in the order they finish, with the
+    index of the item in the request.
     """
+    # Items usually share a handful of provider/model/template combinations
+    contexts = {}
+    for item in batch_input.items:
+        key = (item.provider_id, item.model, item.template_id)
+        if key not in contexts:
+            try:
+                contexts[key] = await get_generation_context(db, item)
+            except HTTPException as error:
+                contexts[key] = error
+
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+    async def generate(index: int, item: MergeRequestDataAiInput) -> dict:
+        context = contexts[(item.provider_id, item.model, item.template_id)]
+        llm_priority.set(PRIORITY_BATCH)
+
+        try:
+            if isinstance(context, HTTPException):
+                raise context
+
+            async with semaphore, SessionLocal() as session:
+                result = await run_generation(session, item, *context)
+        except HTTPException as error:
+            return {
+                "index": index,
+                "status": "error",
+                "status_code": error.status_code,
+                "detail": error.detail,
+            }
+        except Exception:
+            return {
+                "index": index,
+                "status": "error",
+                "status_code": HTTP_500_INTERNAL_SERVER_ERROR,
+                "detail": "Error generating the merge request data",
+            }
 
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_message},
-    ]
-
-    if provider_type == ProvidersTypes.open_router:
-        llm_response = process_with_open_router(model, messages)
-    elif provider_type == ProvidersTypes.cerebras:
-        llm_response = process_with_cerebras(model, messages)
-
-    try:
-        return llm_response.choices[0].message.content
-    except (AttributeError, IndexError, KeyError):
-        return None
-
-
-def extract_section(text, start_tag, end_tag):
-    """Extract text between two markers safely using split."""
-    try:
-        return text.split(start_tag, 1)[1].split(end_tag, 1)[0].strip()
-    except IndexError:
-        return None  # In case tags are missing
-
-
-def truncate_diff(diff_text: str, max_lines: int = 50) -> str:
-    """Keep full diff if small, otherwise truncate with context"""
-    if not diff_text:
-        return ""
-
-    lines = diff_text.split("\n")
-    if len(lines) <= max_lines:
-        return diff_text
-
-    # Keep first max_lines/2 and last max_lines/2 lines to preserve context
-    half = max_lines // 2
-    truncated = (
-        lines[:half]
-        + [f"\n... ({len(lines) - max_lines} lines omitted) ...\n"]
-        + lines[-half:]
-    )
-    return "\n".join(truncated)
+        return {"index": index, "status": "ok", **result.model_dump()}
 
+    async def results():
+        tasks = [
+            asyncio.create_task(generate(index, item))
+            for index, item in enumerate(batch_input.items)
+        ]
 
-def build_optimized_diffs(compare):
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield json.dumps(await task) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
 
-    return {
-        "commits": [
-            {
-                "message": commit["message"],
-                "author": commit["author_name"],
-                "timestamp": commit["created_at"],
-            }
-            for commit in compare["commits"]
-        ],
-        "files_changed": [
-            {
-                "path": diff["new_path"],
-                "status": (
-                    "deleted"
-                    if diff["deleted_file"]
-                    else "new" if diff["new_file"] else "modified"
-                ),
-                "additions": diff.get("diff", "").count("\n+"),
-                "deletions": diff.get("diff", "").count("\n-"),
-                "diff": truncate_diff(diff.get("diff", "")),
-            }
-            for diff in compare["diffs"]
-        ],
-        "total_commits": len(compare["commits"]),
-        "total_files": len(compare["diffs"]),
-    }
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
 
-@router_merge.post("", response_model=MergeRequestInfoResponse)
-async def generate_merge_request_data(
+@router_merge.post(
+    "/jobs", response_model=MergeRequestJobResponse, status_code=HTTP_202_ACCEPTED
+)
+async def create_merge_request_job(
     merge_request_input: MergeRequestDataAiInput, db: AsyncSession = Depends(get_db)
 ):
-    provider = await providers.get_provider_by_id(db, merge_request_input.provider_id)
+    """Queue the generation and return at once, poll GET /jobs/{job_id}."""
+    # Fail fast on unknown providers, models and templates
+    await get_generation_context(db, merge_request_input)
+
+    job = await generation_jobs.create_job(
+        db,
+        seal_job_payload(merge_request_input),
+        datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(seconds=settings.JOB_TTL_SECONDS),
+    )
 
-    if provider is None:
-        raise HTTPException(
-            status_code=HTTP_404_NOT_FOUND,
-            detail=f"Provider with id: {merge_request_input.provider_id} not found",
-        )
+    return MergeRequestJobResponse(
+        job_id=job.id, status=job.status, created_at=job.created_at
+    )
 
-    model = await models.get_model(db, merge_request_input.model)
 
-    if model is None:
-        raise HTTPException(
-            status_code=HTTP_404_NOT_FOUND,
-            derail=f"Model {merge_request_input.model} not found",
-        )
+@router_merge.get("/jobs/{job_id}", response_model=MergeRequestJobResponse)
+async def get_merge_request_job(job_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    job = await generation_jobs.get_job(db, job_id)
 
-    if model.provider_id is not provider.id:
+    if job is None:
         raise HTTPException(
-            status_code=HTTP_400_BAD_REQUEST,
-            detail=f"The Model {merge_request_input.model} is not from the Provider{provider.name}",
+            status_code=HTTP_404_NOT_FOUND, detail=f"Job {job_id} not found"
         )
 
-    template = await templates.get_template(db, merge_request_input.template_id)
-
-    if template is None:
-        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Template not found")
-
-    gl = gitlab.Gitlab("https://gitlab.com", private_token=merge_request_input.pat)
+    return MergeRequestJobResponse(
+        job_id=job.id,
+        status=job.status,
+        attempts=job.attempts,
+        result=job.result,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+    )
 
-    project = gl.projects.get(merge_request_input.project_id)
 
-    compare = project.repository_compare(
-        merge_request_input.target_branch, merge_request_input.origin_branch
-    )
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    mr_data = get_ai_mr_data(
-        json.dumps(build_optimized_diffs(compare)),
-        template.template,
-        template.title,
-        merge_request_input.context_ai,
-        provider.type,
-        model.name,
-    )
 
-    if mr_data is None:
-        raise HTTPException(
-            status_code=HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error calling ai api provider. Try again later",
-        )
+@router_merge.post("/stream")
+async def stream_merge_request_data(
+    merge_request_input: MergeRequestDataAiInput, db: AsyncSession = Depends(get_db)
+):
+    """Same as generate_merge_request_data but streamed as Server-Sent Events.
 
-    title = extract_section(mr_data, "[title:start]", "[title:end]")
-    description = extract_section(mr_data, "[description:start]", "[description:end]")
+    Emits one `title` event, `description` events with the new description
+    text and a final `done` event with the whole result.
+    """
+    provider, model, template = await get_generation_context(db, merge_request_input)
+
+    generation = stream_generation(db, merge_request_input, provider, model, template)
+    # Failures before the first event are still plain http errors
+    first = await anext(generation)
+
+    async def events():
+        yield sse_event(*first)
+        try:
+            async for event, data in generation:
+                yield sse_event(event, data)
+        except HTTPException as error:
+            yield sse_event("error", {"detail": error.detail})
+        except Exception:
+            yield sse_event(
+                "error", {"detail": "Error calling ai api provider. Try again later"}
+            )
 
-    return MergeRequestInfoResponse(
-        title=title,
-        description=description,
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -318,47 +197,27 @@ async def generate_merge_request_data(
 async def create_merge_request(
     merge_request_input: MergeRequestInput, db: AsyncSession = Depends(get_db)
 ):
-    try:
-        gl = gitlab.Gitlab("https://gitlab.com", private_token=merge_request_input.pat)
-    except gitlab.GitlabAuthenticationError:
-        raise HTTPException(
-            status_code=HTTP_401_UNAUTHORIZED,
-            detail="Invalida gitlab personal access token",
-        )
+    gateway = gitlab_sessions.get(merge_request_input.pat)
 
-    try:
-        project = gl.projects.get(merge_request_input.project_id)
-    except gitlab.GitlabGetError as error:
-        if error.response_code == HTTP_404_NOT_FOUND:
-            raise HTTPException(
-                status_code=HTTP_404_NOT_FOUND,
-                detail=f"Project with id:{merge_request_input.project_id} was not found",
-            )
-        raise HTTPException(
-            status_code=error.response_code, detail="Error obtaining the project"
-        )
+    project = await get_gitlab_project(gateway, merge_request_input.project_id)
 
     try:
-        merge_request = project.mergerequests.create(
+        merge_request = await gateway.create_merge_request(
+            project["id"],
             {
                 "source_branch": merge_request_input.origin_branch,
                 "target_branch": merge_request_input.target_branch,
                 "title": merge_request_input.title,
                 "description": merge_request_input.description,
-            }
-        )
-    except gitlab.GitlabCreateError as error:
-        raise HTTPException(
-            status_code=HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error creating merge request {str(error)}",
+            },
         )
-    except Exception as error:
+    except GitlabError as error:
         raise HTTPException(
             status_code=HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error creating merge request {str(error)}",
+            detail=f"Error creating merge request {error.message}",
         )
 
     return CreatedMergeRequestResponse(
-        merge_request_id=merge_request.get_id(),
+        merge_request_id=merge_request["iid"],
         message="Merge request created successfully",
     )
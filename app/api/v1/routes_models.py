@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_409_CONFLICT
 
+from app.api.v1.listing import ListParams, list_catalog
 from app.db.session import get_db
+from app.models.ai_models import AI_Models
 
 from app.repositories import models
 from app.schemas.models import CreateModelInput, ReadModel
@@ -16,7 +18,7 @@ async def create_model(
     model_input: CreateModelInput, db: AsyncSession = Depends(get_db)
 ):
 
-    model = await models.get_model(db, model_input)
+    model = await models.get_model(db, model_input.name)
     if model is not None:
         raise HTTPException(
             status_code=HTTP_409_CONFLICT,
@@ -27,5 +29,9 @@ async def create_model(
 
 
 @router_models.get("", response_model=list[ReadModel], status_code=HTTP_200_OK)
-async def get_all_models(db: AsyncSession = Depends(get_db)):
-    return await models.get_all_models(db)
+async def get_all_models(
+    request: Request,
+    params: ListParams = Depends(),
+    db: AsyncSession = Depends(get_db),
+):
+    return await list_catalog(request, params, db, AI_Models, ReadModel)
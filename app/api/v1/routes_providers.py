@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from starlette.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_409_CONFLICT
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api.v1.listing import ListParams, list_catalog
 from app.db.session import get_db
+from app.models.ai_providers import AI_Providers
 from app.schemas.providers import CreateProviderInput, ProviderReader
 
 from app.repositories import providers
@@ -26,5 +28,9 @@ async def create_provider(
 
 
 @router_providers.get("", response_model=list[ProviderReader], status_code=HTTP_200_OK)
-async def get_all_providers(db: AsyncSession = Depends(get_db)):
-    return await providers.get_all_providers(db)
+async def get_all_providers(
+    request: Request,
+    params: ListParams = Depends(),
+    db: AsyncSession = Depends(get_db),
+):
+    return await list_catalog(request, params, db, AI_Providers, ProviderReader)
@@ -4,6 +4,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.db.session import get_db
+from app.services.compare_cache import compare_cache
+from app.services.generation import generation_flight
 
 status_router = APIRouter()
 
@@ -20,5 +22,9 @@ async def status(db:AsyncSession = Depends(get_db)):
     return { 
         "app": settings.APP_NAME,
         "env": settings.ENV,
-        "database": "ok" if db_ok else "error"
+        "database": "ok" if db_ok else "error",
+        "single_flight": {
+            "generation": generation_flight.counts(),
+            "compare": compare_cache.loads.counts(),
+        },
     }
\ No newline at end of file
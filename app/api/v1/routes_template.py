@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.status import HTTP_200_OK, HTTP_404_NOT_FOUND
 
+from app.api.v1.listing import ListParams, list_catalog
 from app.db.session import get_db
+from app.models.templates import Templates
 from app.schemas.defaults import SuccessResponse
 from app.schemas.templates import TemplateCreate, TemplateRead
 
@@ -13,8 +15,12 @@ router_templates = APIRouter(prefix="/templates")
 
 
 @router_templates.get("", response_model=list[TemplateRead], status_code=HTTP_200_OK)
-async def getAllTemplates(db: AsyncSession = Depends(get_db)):
-    return await templates.get_all_templates(db)
+async def getAllTemplates(
+    request: Request,
+    params: ListParams = Depends(),
+    db: AsyncSession = Depends(get_db),
+):
+    return await list_catalog(request, params, db, Templates, TemplateRead)
 
 
 @router_templates.post(
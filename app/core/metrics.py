@@ -0,0 +1,177 @@
+import bisect
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+REGISTRY: list["Metric"] = []
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+class Metric:
+    """Base of the in-process metrics, one value per combination of labels."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        REGISTRY.append(self)
+
+    def label_values(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+            for key, value in self.values.items()
+        ]
+
+
+class Counter(Metric):
+    """Monotonic counter with optional labels, kept in process memory."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[tuple, float] = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels):
+        self.values[self.label_values(labels)] += amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(self.label_values(labels), 0)
+
+
+class Gauge(Metric):
+    """Value that goes up and down, the last one set wins."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[tuple, float] = defaultdict(float)
+
+    def set(self, value: float, **labels):
+        self.values[self.label_values(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        self.values[self.label_values(labels)] += amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.values[self.label_values(labels)] -= amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(self.label_values(labels), 0)
+
+
+class Histogram(Metric):
+    """Distribution of observations in cumulative buckets plus sum and count."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per labels: counts per bucket (the last one is +Inf), sum, count
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self.label_values(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent in the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        lines = []
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                labels = format_labels(
+                    (*self.labelnames, "le"), (*key, format_value(bound))
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+
+            labels = format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+
+        return lines
+
+    def count(self, **labels) -> int:
+        series = self.values.get(self.label_values(labels))
+        return series[2] if series else 0
+
+    def sum(self, **labels) -> float:
+        series = self.values.get(self.label_values(labels))
+        return series[1] if series else 0.0
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        documentation = metric.documentation.replace("\\", "\\\\").replace("\n", "\\n")
+        lines.append(f"# HELP {metric.name} {documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.render())
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,409 @@
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import Counter
+
+TRACES_DROPPED = Counter(
+    "traces_dropped_total", "Traces not exported because the export queue was full"
+)
+
+current_span: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+
+class Trace:
+    """Spans of a single request or job, exported together once it ends."""
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: list[Span] = []
+
+    def server_timing(self, root: "Span") -> str:
+        """Finished spans summed by name, in the Server-Timing header format."""
+        totals: dict[str, list[float]] = {}
+        for span in self.spans:
+            if span is root or span.duration is None:
+                continue
+            total = totals.setdefault(span.name, [0.0, 0])
+            total[0] += span.duration
+            total[1] += 1
+
+        entries = [
+            f"{name};dur={seconds * 1000:.1f}"
+            + (f';desc="x{count}"' if count > 1 else "")
+            for name, (seconds, count) in totals.items()
+        ]
+        entries.append(f"total;dur={root.elapsed() * 1000:.1f}")
+        entries.append(f'trace;desc="{self.trace_id}"')
+
+        return ", ".join(entries)
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "trace",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "start_ns",
+        "started",
+        "duration",
+        "error",
+    )
+
+    def __init__(
+        self, name: str, trace: Trace | None, parent_id: str | None, attributes: dict
+    ):
+        self.name = name
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.started = time.perf_counter()
+        self.duration: float | None = None
+        self.error: str | None = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def end_ns(self) -> int:
+        return self.start_ns + int((self.duration or 0.0) * 1e9)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id if self.trace else None,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+@contextmanager
+def _activate(span: Span):
+    token = current_span.set(span)
+    try:
+        yield span
+    except BaseException as error:
+        span.error = type(error).__name__
+        raise
+    finally:
+        span.duration = span.elapsed()
+        current_span.reset(token)
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str, bool] | None:
+    """Trace id, parent span id and sampled flag of a W3C traceparent."""
+    if not value:
+        return None
+
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+
+    return parts[1], parts[2], sampled
+
+
+@contextmanager
+def start_trace(name: str, traceparent: str | None = None, **attributes):
+    """Root span of a new trace, continuing the caller's trace when given."""
+    parent = parse_traceparent(traceparent)
+    if parent is None:
+        trace_id, parent_id = os.urandom(16).hex(), None
+        sampled = random.random() < settings.TRACING_SAMPLE_RATIO
+    else:
+        trace_id, parent_id, sampled = parent
+
+    trace = Trace(trace_id, sampled)
+    root = Span(name, trace, parent_id, attributes)
+    trace.spans.append(root)
+
+    try:
+        with _activate(root):
+            yield root
+    finally:
+        tracer.submit(trace)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Child span of the current one, not recorded outside of a trace."""
+    parent = current_span.get()
+    trace = parent.trace if parent is not None else None
+
+    child = Span(name, trace, parent.span_id if parent else None, attributes)
+    if trace is not None:
+        trace.spans.append(child)
+
+    with _activate(child):
+        yield child
+
+
+def set_span_attributes(**attributes):
+    span = current_span.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+class SpanExporter(ABC):
+    """Sends batches of finished traces somewhere."""
+
+    @abstractmethod
+    async def export(self, traces: list[Trace]):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+def span_lines(traces: list[Trace]) -> str:
+    return "".join(
+        json.dumps(span.to_dict(), default=str) + "\n"
+        for trace in traces
+        for span in trace.spans
+    )
+
+
+class ConsoleExporter(SpanExporter):
+    """One json line per span on stdout."""
+
+    async def export(self, traces: list[Trace]):
+        sys.stdout.write(span_lines(traces))
+        sys.stdout.flush()
+
+
+class FileExporter(SpanExporter):
+    """One json line per span, appended to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, lines: str):
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(lines)
+
+    async def export(self, traces: list[Trace]):
+        await asyncio.to_thread(self.write, span_lines(traces))
+
+
+def otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_attributes(attributes: dict) -> list[dict]:
+    return [
+        {"key": key, "value": otlp_value(value)}
+        for key, value in attributes.items()
+        if value is not None
+    ]
+
+
+def otlp_span(span: Span) -> dict:
+    data = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        # Server for the roots, internal for the rest
+        "kind": 2 if span is span.trace.spans[0] else 1,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns()),
+        "attributes": otlp_attributes(span.attributes),
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id is not None:
+        data["parentSpanId"] = span.parent_id
+    return data
+
+
+class OTLPExporter(SpanExporter):
+    """OTLP/HTTP with the json encoding, as accepted by collectors on :4318."""
+
+    def __init__(self, endpoint: str, headers: dict[str, str]):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.client = httpx.AsyncClient(headers=headers, timeout=10.0)
+
+    async def export(self, traces: list[Trace]):
+        payload = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": otlp_attributes(
+                            {"service.name": settings.APP_NAME}
+                        )
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "app"},
+                            "spans": [
+                                otlp_span(span)
+                                for trace in traces
+                                for span in trace.spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+        response = await self.client.post(self.url, json=payload)
+        response.raise_for_status()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def get_exporter(name: str) -> SpanExporter | None:
+    if name == "console":
+        return ConsoleExporter()
+    if name == "file":
+        return FileExporter(settings.TRACING_FILE_PATH)
+    if name == "otlp":
+        return OTLPExporter(
+            settings.TRACING_OTLP_ENDPOINT, settings.TRACING_OTLP_HEADERS
+        )
+    return None
+
+
+class Tracer:
+    """Exports the finished sampled traces in batches, off the request path.
+
+    Traces are dropped rather than queued without bound when the exporter
+    can not keep up.
+    """
+
+    def __init__(self):
+        self.exporter: SpanExporter | None = None
+        self.queue: asyncio.Queue[Trace] | None = None
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        if not settings.TRACING_ENABLED:
+            return
+
+        self.exporter = get_exporter(settings.TRACING_EXPORTER)
+        if self.exporter is not None:
+            self.queue = asyncio.Queue(settings.TRACING_QUEUE_SIZE)
+            self.task = asyncio.create_task(self.run())
+
+    async def aclose(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+        if self.exporter is not None:
+            await self.flush()
+            await self.exporter.aclose()
+            self.exporter = None
+        self.queue = None
+
+    def submit(self, trace: Trace):
+        if self.queue is None or not trace.sampled:
+            return
+
+        try:
+            self.queue.put_nowait(trace)
+        except asyncio.QueueFull:
+            TRACES_DROPPED.inc()
+
+    def batch(self) -> list[Trace]:
+        traces = []
+        while len(traces) < settings.TRACING_BATCH_SIZE and not self.queue.empty():
+            traces.append(self.queue.get_nowait())
+        return traces
+
+    async def flush(self):
+        while traces := self.batch():
+            try:
+                await self.exporter.export(traces)
+            except Exception:
+                return
+
+    async def run(self):
+        while True:
+            traces = [await self.queue.get()]
+            traces += self.batch()
+
+            try:
+                await self.exporter.export(traces)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # The collector is down, these traces are lost
+                pass
+
+
+tracer = Tracer()
+
+
+class TracingMiddleware:
+    """Root span per http request, with the Server-Timing response header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        traceparent = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+
+        with start_trace(
+            f"{method} {scope['path']}", traceparent, method=method
+        ) as root:
+
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    root.set(status_code=message["status"])
+                    if settings.TRACING_SERVER_TIMING:
+                        timing = root.trace.server_timing(root)
+                        message = {
+                            **message,
+                            "headers": [
+                                *message.get("headers", []),
+                                (b"server-timing", timing.encode("latin-1")),
+                            ],
+                        }
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                # The matched route is only known once the router ran
+                route = scope.get("route")
+                if route is not None and hasattr(route, "path"):
+                    root.name = f"{method} {route.path}"
+                    root.set(route=route.path)
@@ -1,8 +1,87 @@
+import time
+import uuid
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram
+
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time to get a connection from the pool, waiting and connecting included",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Checkouts that gave up after DB_POOL_TIMEOUT_SECONDS",
+)
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Connections checked out of the pool"
+)
+DB_POOL_SATURATION = Gauge(
+    "db_pool_saturation", "Connections in use over pool size plus max overflow"
+)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+
+
+def connect_args() -> dict:
+    if make_url(settings.DSN).get_driver_name() != "asyncpg":
+        return {}
+
+    if settings.DB_PGBOUNCER:
+        # Prepared statements don't survive PgBouncer transaction pooling
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+
+    return {
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+
+
+engine = create_async_engine(
+    settings.DSN,
+    echo=settings.DB_ECHO,
+    pool_pre_ping=True,
+    poolclass=InstrumentedPool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    connect_args=connect_args(),
+)
+
+pool_capacity = max(settings.DB_POOL_SIZE + max(settings.DB_MAX_OVERFLOW, 0), 1)
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_IN_USE.inc()
+    DB_POOL_SATURATION.set(DB_POOL_IN_USE.value() / pool_capacity)
+
+
+@event.listens_for(engine.sync_engine, "checkin")
+def on_checkin(dbapi_connection, connection_record):
+    DB_POOL_IN_USE.dec()
+    DB_POOL_SATURATION.set(DB_POOL_IN_USE.value() / pool_capacity)
 
-engine = create_async_engine(settings.DSN, echo=True, pool_pre_ping=True)
 
 SessionLocal = async_sessionmaker(
     bind=engine,
@@ -1,16 +1,38 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from app.api.v1.routes_merge_request import router_merge
+from app.api.v1.routes_metrics import metrics_router
 from app.api.v1.routes_models import router_models
 from app.api.v1.routes_providers import router_providers
 from app.api.v1.routes_status import status_router
 from app.api.v1.routes_template import router_templates
 from app.core.config import settings
+from app.core.tracing import TracingMiddleware, tracer
+from app.services.catalog_cache import catalog_listener
+from app.services.gitlab_gateway import gitlab_sessions
+from app.services.job_worker import job_workers
+from app.services.llm_clients import llm_clients
 
 # cors
 from fastapi.middleware.cors import CORSMiddleware
 
 
-app = FastAPI(title=settings.APP_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tracer.start()
+    llm_clients.start()
+    catalog_listener.start()
+    job_workers.start()
+    yield
+    await job_workers.aclose()
+    await catalog_listener.aclose()
+    await llm_clients.aclose()
+    await gitlab_sessions.aclose()
+    await tracer.aclose()
+
+
+app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
 
 routers_v1 = [
     status_router,
@@ -23,6 +45,9 @@ routers_v1 = [
 for router in routers_v1:
     app.include_router(router, prefix="/api/v1")
 
+# Scraped at the conventional path, outside of the versioned api
+app.include_router(metrics_router)
+
 origins = [
     "*",
 ]
@@ -33,8 +58,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Outermost, so the spans cover the whole request
+app.add_middleware(TracingMiddleware)
+
 
 @app.get("/")
 def root():
@@ -2,3 +2,5 @@
 from .templates import Templates  # add others as you create them
 from .ai_providers import AI_Providers
 from .ai_models import AI_Models
+from .generation_cache import GenerationCache
+from .generation_jobs import GenerationJobs
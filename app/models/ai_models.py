@@ -1,4 +1,5 @@
-from sqlalchemy import ForeignKey, Integer, String
+from enum import Enum
+from sqlalchemy import ForeignKey, Index, Integer, String, Enum as SqlEnum, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
 from app.models.ai_providers import AI_Providers
@@ -6,9 +7,27 @@ from app.models.soft_delete_mixin import SoftDeleteMixin
 from app.models.timestamp_mixin import TimestampMixin
 
 
+class PayloadEncodings(str, Enum):
+    json = "json"
+    compact = "compact"
+
+
 class AI_Models(Base, TimestampMixin, SoftDeleteMixin):
     __tablename__ = "ai_models"
+    __table_args__ = (
+        Index(
+            "ix_ai_models_name_provider_id_active",
+            "name",
+            "provider_id",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, unique=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
+    context_window: Mapped[int] = mapped_column(Integer, nullable=True)
+    payload_encoding: Mapped[PayloadEncodings] = mapped_column(
+        SqlEnum(PayloadEncodings, name="payload_encoding", native_enum=False),
+        nullable=True,
+    )
     provider_id: Mapped[int] = mapped_column(ForeignKey("ai_providers.id"))
     provider: Mapped[AI_Providers] = relationship()
@@ -0,0 +1,44 @@
+import datetime
+import uuid
+from enum import Enum
+from sqlalchemy import DateTime, Index, Integer, Text, Enum as SqlEnum, func
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+from app.models.timestamp_mixin import TimestampMixin
+
+
+class JobStatus(str, Enum):
+    pending = "pending"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+    expired = "expired"
+
+
+class GenerationJobs(Base, TimestampMixin):
+    __tablename__ = "generation_jobs"
+    __table_args__ = (
+        Index("ix_generation_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    status: Mapped[JobStatus] = mapped_column(
+        SqlEnum(JobStatus, name="job_status", native_enum=False),
+        nullable=False,
+        default=JobStatus.pending,
+    )
+    # The generation input with the pat encrypted, cleared once the job finishes
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=True)
+    result: Mapped[dict] = mapped_column(JSONB, nullable=True)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    run_after: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    locked_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
@@ -1,4 +1,5 @@
 from sqlalchemy import Integer, String, Text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 from app.db.base import Base
 from app.models.soft_delete_mixin import SoftDeleteMixin
@@ -12,3 +13,4 @@ class Templates(Base, TimestampMixin, SoftDeleteMixin):
     template: Mapped[str] = mapped_column(Text, nullable=False)
     title: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=True)
+    diff_filters: Mapped[dict] = mapped_column(JSONB, nullable=True)
@@ -0,0 +1,47 @@
+from sqlalchemy import and_, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.ai_models import AI_Models
+from app.models.ai_providers import AI_Providers
+from app.models.templates import Templates
+
+CATALOG_CHANNEL = "catalog_changes"
+
+
+async def notify_catalog_change(db: AsyncSession, table: str):
+    """Queue a notification that is sent to every listener when db commits."""
+    await db.execute(select(func.pg_notify(CATALOG_CHANNEL, table)))
+
+
+async def get_generation_rows(
+    db: AsyncSession, provider_id: int, model_name: str, template_id: int
+) -> tuple[AI_Providers | None, AI_Models | None, Templates | None]:
+    """Provider, model and template of a generation in a single round trip.
+
+    Each one is outer joined to a one row anchor, so the missing ones come
+    back as None. Among models sharing the name, the one of the provider wins.
+    """
+    anchor = select(literal(1).label("anchor")).subquery()
+
+    result = await db.execute(
+        select(AI_Providers, AI_Models, Templates)
+        .select_from(anchor)
+        .outerjoin(
+            AI_Providers,
+            and_(AI_Providers.id == provider_id, AI_Providers.deleted_at.is_(None)),
+        )
+        .outerjoin(
+            AI_Models,
+            and_(AI_Models.name == model_name, AI_Models.deleted_at.is_(None)),
+        )
+        .outerjoin(
+            Templates,
+            and_(Templates.id == template_id, Templates.deleted_at.is_(None)),
+        )
+        .order_by((AI_Models.provider_id == provider_id).desc().nulls_last())
+        .limit(1)
+    )
+
+    provider, model, template = result.one()
+
+    return provider, model, template
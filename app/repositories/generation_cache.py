@@ -0,0 +1,41 @@
+import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.generation_cache import GenerationCache
+
+
+async def get_generation(db: AsyncSession, key: str) -> GenerationCache | None:
+    result = await db.execute(
+        select(GenerationCache).where(
+            GenerationCache.key == key, GenerationCache.expires_at > func.now()
+        )
+    )
+
+    return result.scalar_one_or_none()
+
+
+async def save_generation(
+    db: AsyncSession,
+    key: str,
+    title: str,
+    description: str,
+    expires_at: datetime.datetime,
+):
+    statement = insert(GenerationCache).values(
+        key=key, title=title, description=description, expires_at=expires_at
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[GenerationCache.key],
+        set_={
+            "title": statement.excluded.title,
+            "description": statement.excluded.description,
+            "expires_at": statement.excluded.expires_at,
+            "updated_at": func.now(),
+        },
+    )
+
+    await db.execute(statement)
+    await db.commit()
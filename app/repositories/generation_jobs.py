@@ -0,0 +1,175 @@
+import datetime
+import uuid
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.generation_jobs import GenerationJobs, JobStatus
+
+
+async def create_job(
+    db: AsyncSession, payload: dict, expires_at: datetime.datetime
+) -> GenerationJobs:
+    job = GenerationJobs(payload=payload, expires_at=expires_at)
+
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+
+    return job
+
+
+async def get_job(db: AsyncSession, job_id: uuid.UUID) -> GenerationJobs | None:
+    result = await db.execute(select(GenerationJobs).where(GenerationJobs.id == job_id))
+
+    return result.scalar_one_or_none()
+
+
+async def claim_job(db: AsyncSession, max_attempts: int) -> GenerationJobs | None:
+    """Take the oldest runnable job, skipping the ones other workers hold."""
+    next_job = (
+        select(GenerationJobs.id)
+        .where(
+            GenerationJobs.status == JobStatus.pending,
+            GenerationJobs.run_after <= func.now(),
+            GenerationJobs.expires_at > func.now(),
+            GenerationJobs.attempts < max_attempts,
+        )
+        .order_by(GenerationJobs.run_after)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+
+    result = await db.execute(
+        update(GenerationJobs)
+        .where(GenerationJobs.id == next_job)
+        .values(
+            status=JobStatus.running,
+            attempts=GenerationJobs.attempts + 1,
+            locked_at=func.now(),
+            updated_at=func.now(),
+        )
+        .returning(GenerationJobs)
+        .execution_options(synchronize_session=False)
+    )
+    job = result.scalar_one_or_none()
+    await db.commit()
+
+    return job
+
+
+def _held(job_id: uuid.UUID, attempts: int) -> tuple:
+    """Still running under the claim that set attempts to this value."""
+    return (
+        GenerationJobs.id == job_id,
+        GenerationJobs.status == JobStatus.running,
+        GenerationJobs.attempts == attempts,
+    )
+
+
+async def touch_job(db: AsyncSession, job_id: uuid.UUID, attempts: int):
+    """Refresh the lock of a job its worker is still running."""
+    await db.execute(
+        update(GenerationJobs)
+        .where(*_held(job_id, attempts))
+        .values(locked_at=func.now())
+    )
+    await db.commit()
+
+
+async def complete_job(
+    db: AsyncSession, job_id: uuid.UUID, attempts: int, result: dict
+):
+    # A job the sweeper expired, failed or handed to another worker meanwhile
+    # keeps that state
+    await db.execute(
+        update(GenerationJobs)
+        .where(*_held(job_id, attempts))
+        .values(
+            status=JobStatus.succeeded,
+            result=result,
+            error=None,
+            payload=None,
+            locked_at=None,
+            updated_at=func.now(),
+        )
+    )
+    await db.commit()
+
+
+async def fail_job(
+    db: AsyncSession,
+    job_id: uuid.UUID,
+    attempts: int,
+    error: str,
+    retry_in: datetime.timedelta | None = None,
+):
+    """Put the job back in the queue after retry_in, or fail it for good.
+
+    Only a job still held by the claim that set attempts is updated, a
+    finished state or another worker's claim is never overwritten.
+    """
+    values = {"error": error, "locked_at": None, "updated_at": func.now()}
+
+    if retry_in is None:
+        values.update(status=JobStatus.failed, payload=None)
+    else:
+        values.update(status=JobStatus.pending, run_after=func.now() + retry_in)
+
+    await db.execute(
+        update(GenerationJobs).where(*_held(job_id, attempts)).values(**values)
+    )
+    await db.commit()
+
+
+async def expire_jobs(
+    db: AsyncSession,
+    max_attempts: int,
+    locked_before: datetime.datetime,
+    delete_before: datetime.datetime,
+):
+    """Housekeeping of the queue.
+
+    Running jobs locked before locked_before belong to a dead worker, as live
+    ones keep refreshing their lock, and go back to the queue (or fail when
+    out of attempts), unfinished jobs past their expires_at are expired and
+    jobs that expired before delete_before are removed.
+    """
+    stale = (
+        GenerationJobs.status == JobStatus.running,
+        GenerationJobs.locked_at < locked_before,
+    )
+    await db.execute(
+        update(GenerationJobs)
+        .where(*stale, GenerationJobs.attempts < max_attempts)
+        .values(status=JobStatus.pending, locked_at=None, updated_at=func.now())
+    )
+    await db.execute(
+        update(GenerationJobs)
+        .where(*stale, GenerationJobs.attempts >= max_attempts)
+        .values(
+            status=JobStatus.failed,
+            error="The worker running the job stopped",
+            payload=None,
+            locked_at=None,
+            updated_at=func.now(),
+        )
+    )
+    await db.execute(
+        update(GenerationJobs)
+        .where(
+            GenerationJobs.status.in_([JobStatus.pending, JobStatus.running]),
+            GenerationJobs.expires_at <= func.now(),
+        )
+        .values(
+            status=JobStatus.expired,
+            payload=None,
+            locked_at=None,
+            updated_at=func.now(),
+        )
+    )
+    await db.execute(
+        delete(GenerationJobs).where(GenerationJobs.expires_at < delete_before)
+    )
+    await db.commit()
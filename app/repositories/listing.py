@@ -0,0 +1,39 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+
+async def list_rows(
+    db: AsyncSession,
+    model,
+    limit: int | None = None,
+    after_id: int | None = None,
+    columns: list[str] | None = None,
+) -> list:
+    """Active rows by id, the page after after_id when limit is given.
+
+    With columns, only those are loaded, the others must not be accessed.
+    """
+    statement = select(model).where(model.deleted_at.is_(None)).order_by(model.id)
+
+    if after_id is not None:
+        statement = statement.where(model.id > after_id)
+    if limit is not None:
+        statement = statement.limit(limit)
+    if columns is not None:
+        statement = statement.options(
+            load_only(*(getattr(model, column) for column in columns))
+        )
+
+    result = await db.execute(statement)
+
+    return result.scalars().all()
+
+
+async def list_version(db: AsyncSession, model) -> tuple:
+    """Changes whenever a row of the table is created, updated or deleted."""
+    result = await db.execute(
+        select(func.count(), func.max(model.updated_at), func.max(model.deleted_at))
+    )
+
+    return tuple(result.one())
@@ -2,6 +2,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.ai_models import AI_Models
+from app.repositories.catalog import notify_catalog_change
 from app.schemas.models import CreateModelInput
 
 
@@ -9,6 +10,7 @@ async def create_model(db: AsyncSession, create_model: CreateModelInput) -> AI_M
     ai_model = AI_Models(**create_model.model_dump())
 
     db.add(ai_model)
+    await notify_catalog_change(db, AI_Models.__tablename__)
     await db.commit()
     await db.refresh(ai_model)
 
@@ -21,9 +23,3 @@ async def get_model(db: AsyncSession, name: str) -> AI_Models | None:
     )
 
     return model.scalar_one_or_none()
-
-
-async def get_all_models(db: AsyncSession) -> list[AI_Models]:
-    models = await db.execute(select(AI_Models).where(AI_Models.deleted_at.is_(None)))
-
-    return models.scalars().all()
@@ -2,6 +2,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.ai_providers import AI_Providers
+from app.repositories.catalog import notify_catalog_change
 from app.schemas.providers import CreateProviderInput
 
 
@@ -11,6 +12,7 @@ async def create_provider(
     provider = AI_Providers(**provider_input.model_dump())
 
     db.add(provider)
+    await notify_catalog_change(db, AI_Providers.__tablename__)
     await db.commit()
     await db.refresh(provider)
 
@@ -38,11 +40,3 @@ async def get_provider_by_id(db: AsyncSession, provider_id: int) -> AI_Providers
     )
 
     return provider.scalar_one_or_none()
-
-
-async def get_all_providers(db: AsyncSession) -> list[AI_Providers]:
-    providers = await db.execute(
-        select(AI_Providers).where(AI_Providers.deleted_at.is_(None))
-    )
-
-    return providers.scalars().all()
@@ -2,6 +2,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.templates import Templates
+from app.repositories.catalog import notify_catalog_change
 from app.schemas.templates import TemplateCreate
 
 
@@ -11,6 +12,7 @@ async def create_template(
     template = Templates(**template_input.model_dump())
 
     db.add(template)
+    await notify_catalog_change(db, Templates.__tablename__)
     await db.commit()
     await db.refresh(template)
 
@@ -29,12 +31,5 @@ async def get_template(db: AsyncSession, template_id: int) -> Templates | None:
 
 async def deleteTemplate(db: AsyncSession, template: Templates):
     template.soft_delete()
+    await notify_catalog_change(db, Templates.__tablename__)
     await db.commit()
-
-
-async def get_all_templates(db: AsyncSession) -> list[Templates]:
-    templates = await db.execute(
-        select(Templates).where(Templates.deleted_at.is_(None))
-    )
-
-    return templates.scalars().all()
@@ -1,5 +1,9 @@
+import datetime
+import uuid
 from enum import Enum
-from pydantic import BaseModel, constr
+from pydantic import BaseModel, Field, constr
+
+from app.models.generation_jobs import JobStatus
 
 class MergeRequestInput(BaseModel):
     project_id: int
@@ -21,11 +25,27 @@ class MergeRequestDataAiInput(BaseModel):
     provider_id: int
     model: str
 
+    force_refresh: bool = False
+
+
+class MergeRequestBatchInput(BaseModel):
+    items: list[MergeRequestDataAiInput] = Field(min_length=1, max_length=200)
+
 
 class MergeRequestInfoResponse(BaseModel):
     title: str
     description: str
 
+class MergeRequestJobResponse(BaseModel):
+    job_id: uuid.UUID
+    status: JobStatus
+    attempts: int = 0
+    result: MergeRequestInfoResponse | None = None
+    error: str | None = None
+    created_at: datetime.datetime | None = None
+    updated_at: datetime.datetime | None = None
+
+
 class CreatedMergeRequestResponse(BaseModel):
     merge_request_id: int
     message: str
\ No newline at end of file
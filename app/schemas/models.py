@@ -2,10 +2,14 @@ from datetime import datetime
 
 from pydantic import BaseModel
 
+from app.models.ai_models import PayloadEncodings
+
 
 class ModelBase(BaseModel):
     provider_id: int
     name: str
+    context_window: int | None = None
+    payload_encoding: PayloadEncodings | None = None
 
 
 class CreateModelInput(ModelBase):
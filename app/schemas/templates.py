@@ -2,10 +2,18 @@ from datetime import datetime
 from pydantic import BaseModel, constr
 
 
+class DiffFilters(BaseModel):
+    exclude: list[str] = []
+    include: list[str] = []
+    max_file_bytes: int | None = None
+    max_line_length: int | None = None
+
+
 class TemplateBase(BaseModel):
     title: constr(min_length=1, max_length=255)
     template: constr(min_length=1)
     description: constr(min_length=1)
+    diff_filters: DiffFilters | None = None
 
 
 class TemplateCreate(TemplateBase):
@@ -0,0 +1,152 @@
+import asyncio
+
+import asyncpg
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.models.ai_models import AI_Models
+from app.models.ai_providers import AI_Providers
+from app.models.templates import Templates
+from app.repositories import catalog
+from app.repositories.catalog import CATALOG_CHANNEL
+from app.services.ttl_cache import TTLCache
+
+CATALOG_CACHE_LOOKUPS = Counter(
+    "catalog_cache_lookups_total",
+    "Generation catalog lookups answered from the cache (hit) or the database (miss)",
+    ("result",),
+)
+
+
+class CatalogCache:
+    """In-process cache of providers, models and templates per table.
+
+    Rows are detached from the session that loaded them, so they are meant
+    to be read only. A table is cleared whenever a notification for it comes
+    in, the ttl only bounds staleness while the listener is disconnected.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._tables: dict[str, TTLCache] = {}
+        self._versions: dict[str, int] = {}
+
+    def _table(self, table: str) -> TTLCache:
+        if table not in self._tables:
+            self._tables[table] = TTLCache(self.ttl_seconds, self.max_size)
+        return self._tables[table]
+
+    def version(self, table: str) -> int:
+        return self._versions.get(table, 0)
+
+    def lookup(self, table: str, key):
+        return self._table(table).get(key)
+
+    def store(self, db: AsyncSession, table: str, key, row, version: int):
+        # Not cached when missing or when the table changed during the load
+        if row is None or version != self.version(table):
+            return
+
+        db.expunge(row)
+        self._table(table).set(key, row)
+
+    def invalidate(self, table: str | None = None):
+        tables = list(self._tables) if table is None else [table]
+
+        for name in tables:
+            self._versions[name] = self.version(name) + 1
+            if name in self._tables:
+                self._tables[name].clear()
+
+
+catalog_cache = CatalogCache(
+    settings.CATALOG_CACHE_TTL_SECONDS, settings.CATALOG_CACHE_SIZE
+)
+
+
+async def get_generation_rows(
+    db: AsyncSession, provider_id: int, model_name: str, template_id: int
+) -> tuple[AI_Providers | None, AI_Models | None, Templates | None]:
+    """Read-through lookup of catalog.get_generation_rows."""
+    keys = (
+        (AI_Providers.__tablename__, provider_id),
+        (AI_Models.__tablename__, (model_name, provider_id)),
+        (Templates.__tablename__, template_id),
+    )
+
+    if not settings.CATALOG_CACHE_ENABLED:
+        return await catalog.get_generation_rows(
+            db, provider_id, model_name, template_id
+        )
+
+    rows = tuple(catalog_cache.lookup(table, key) for table, key in keys)
+    if all(row is not None for row in rows):
+        CATALOG_CACHE_LOOKUPS.inc(result="hit")
+        return rows
+
+    CATALOG_CACHE_LOOKUPS.inc(result="miss")
+    versions = [catalog_cache.version(table) for table, _ in keys]
+    rows = await catalog.get_generation_rows(db, provider_id, model_name, template_id)
+
+    for (table, key), row, version in zip(keys, rows, versions):
+        catalog_cache.store(db, table, key, row, version)
+
+    return rows
+
+
+class CatalogListener:
+    """LISTEN on the catalog channel and invalidate the cache of this process.
+
+    Runs on a dedicated asyncpg connection since pooled connections are
+    handed out and reset. Everything is invalidated on every (re)connect, as
+    notifications sent while disconnected are lost.
+    """
+
+    def __init__(self):
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        if settings.CATALOG_CACHE_ENABLED and settings.CATALOG_LISTEN_ENABLED:
+            self.task = asyncio.create_task(self.listen())
+
+    async def aclose(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def on_notification(self, connection, pid, channel, payload):
+        catalog_cache.invalidate(payload or None)
+
+    async def listen(self):
+        dsn = make_url(settings.DSN).set(drivername="postgresql")
+
+        while True:
+            try:
+                connection = await asyncpg.connect(
+                    dsn.render_as_string(hide_password=False)
+                )
+            except Exception:
+                await asyncio.sleep(settings.CATALOG_LISTEN_RETRY_SECONDS)
+                continue
+
+            closed = asyncio.Event()
+            connection.add_termination_listener(lambda _: closed.set())
+
+            try:
+                await connection.add_listener(CATALOG_CHANNEL, self.on_notification)
+                catalog_cache.invalidate()
+                await closed.wait()
+            except Exception:
+                pass
+            finally:
+                await connection.close()
+
+            catalog_cache.invalidate()
+            await asyncio.sleep(settings.CATALOG_LISTEN_RETRY_SECONDS)
+
+
+catalog_listener = CatalogListener()
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge
+from app.services.single_flight import SingleFlight
+
+COMPARE_CACHE_LOOKUPS = Counter(
+    "compare_cache_lookups_total", "Compare cache lookups by result", ("result",)
+)
+COMPARE_CACHE_BYTES = Gauge(
+    "compare_cache_bytes", "Diff and commit message bytes held by the compare cache"
+)
+
+
+def compare_bytes(optimized_diffs: dict) -> int:
+    """Rough size of a processed compare: the text it was parsed from."""
+    return sum(file["bytes"] for file in optimized_diffs["files_changed"]) + sum(
+        len(commit["message"]) for commit in optimized_diffs["commits"]
+    )
+
+
+class CompareCache:
+    """LRU cache of processed compares keyed by (project_id, base_sha, head_sha).
+
+    A compare between two commits never changes, so entries don't expire and
+    are only evicted once more than max_size of them are stored or they hold
+    more than max_bytes of diff text. A compare bigger than max_bytes on its
+    own is not cached. Concurrent loads of the same key share a single
+    GitLab call.
+    """
+
+    def __init__(self, max_size: int, max_bytes: int):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items: OrderedDict = OrderedDict()
+        self.loads = SingleFlight("compare")
+
+    async def get_or_load(self, key: tuple, load: Callable[[], Awaitable]):
+        if key in self._items:
+            COMPARE_CACHE_LOOKUPS.inc(result="hit")
+            self._items.move_to_end(key)
+            return self._items[key][1]
+
+        COMPARE_CACHE_LOOKUPS.inc(result="miss")
+
+        return await self.loads.do(key, lambda: self._load(key, load))
+
+    async def _load(self, key: tuple, load: Callable[[], Awaitable]):
+        value = await load()
+
+        size = compare_bytes(value)
+        if size > self.max_bytes:
+            return value
+
+        self._items[key] = (size, value)
+        self.total_bytes += size
+
+        while len(self._items) > self.max_size or self.total_bytes > self.max_bytes:
+            _, (evicted, _) = self._items.popitem(last=False)
+            self.total_bytes -= evicted
+
+        COMPARE_CACHE_BYTES.set(self.total_bytes)
+
+        return value
+
+
+compare_cache = CompareCache(
+    settings.COMPARE_CACHE_SIZE, settings.COMPARE_CACHE_MAX_BYTES
+)
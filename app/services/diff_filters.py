@@ -0,0 +1,96 @@
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+
+from app.core.config import settings
+from app.services.file_patterns import (
+    GENERATED_PATTERNS,
+    LOCKFILE_PATTERNS,
+    VENDORED_PATTERNS,
+)
+
+LABELS = {
+    "lockfile": "lockfile updated",
+    "vendored": "vendored file updated",
+    "generated": "generated file updated",
+    "binary": "binary file changed",
+    "minified": "minified file updated",
+    "too_large": "large diff omitted",
+    "excluded": "filtered file updated",
+}
+
+
+@dataclass
+class DiffFilterRules:
+    exclude: list[str] = field(default_factory=list)
+    include: list[str] = field(default_factory=list)
+    max_file_bytes: int = 0
+    max_line_length: int = 0
+
+
+def get_filter_rules(template_rules: dict | None) -> DiffFilterRules:
+    """Global rules from the settings, extended by the rules of the template."""
+    template_rules = template_rules or {}
+
+    return DiffFilterRules(
+        exclude=settings.DIFF_FILTER_EXCLUDE + (template_rules.get("exclude") or []),
+        include=template_rules.get("include") or [],
+        max_file_bytes=template_rules.get("max_file_bytes")
+        or settings.DIFF_FILTER_MAX_FILE_BYTES,
+        max_line_length=template_rules.get("max_line_length")
+        or settings.DIFF_FILTER_MAX_LINE_LENGTH,
+    )
+
+
+def _matches(path: str, patterns: list[str]) -> bool:
+    return any(fnmatch(path, pattern) for pattern in patterns)
+
+
+def noise_reason(file: dict, rules: DiffFilterRules) -> str | None:
+    path = file["path"]
+
+    if _matches(path, rules.include):
+        return None
+    if _matches(path, rules.exclude):
+        return "excluded"
+    if _matches(path, LOCKFILE_PATTERNS):
+        return "lockfile"
+    if _matches(path, VENDORED_PATTERNS):
+        return "vendored"
+    if file.get("generated") or _matches(path, GENERATED_PATTERNS):
+        return "generated"
+    if file.get("binary"):
+        return "binary"
+    if file.get("too_large") or file.get("bytes", 0) > rules.max_file_bytes:
+        return "too_large"
+    if any(
+        len(line) > rules.max_line_length
+        for hunk in file["hunks"]
+        for line in hunk.lines
+    ):
+        return "minified"
+
+    return None
+
+
+def filter_noise(optimized_diffs: dict, rules: DiffFilterRules) -> dict:
+    """Replace the hunks of noisy files with a one line summary.
+
+    Lockfiles, vendored, generated, binary, minified and oversized files
+    rarely say anything about the change but can take most of the prompt.
+    """
+    files_changed = []
+
+    for file in optimized_diffs["files_changed"]:
+        reason = noise_reason(file, rules)
+
+        if reason is not None:
+            file = {
+                **file,
+                "hunks": [],
+                "summary": (
+                    f"{LABELS[reason]}, +{file['additions']}/-{file['deletions']}"
+                ),
+            }
+        files_changed.append(file)
+
+    return {**optimized_diffs, "files_changed": files_changed}
@@ -0,0 +1,197 @@
+import json
+import math
+from collections import deque
+from fnmatch import fnmatch
+
+from app.core.config import settings
+from app.services.diff_parser import Hunk
+from app.services.file_patterns import (
+    GENERATED_PATTERNS,
+    LOCKFILE_PATTERNS,
+    VENDORED_PATTERNS,
+)
+from app.services.payload_encoders import PayloadEncoder
+
+SOURCE, TEST, GENERATED = 0, 1, 2
+
+TEST_PATTERNS = [
+    "test_*",
+    "*_test.*",
+    "*.test.*",
+    "*.spec.*",
+    "*/test/*",
+    "*/tests/*",
+    "*/__tests__/*",
+    "*/spec/*",
+    "test/*",
+    "tests/*",
+    "spec/*",
+]
+
+# Ranked last: the files the diff filter treats as noise when it is enabled
+LOW_PRIORITY_PATTERNS = LOCKFILE_PATTERNS + VENDORED_PATTERNS + GENERATED_PATTERNS
+
+# Tokens used by the keys of a file entry in the payload
+FILE_OVERHEAD_TOKENS = 28
+# Tokens used by the top level keys of the payload and the omitted report
+PAYLOAD_OVERHEAD_TOKENS = 40
+MIN_TRUNCATED_HUNK_TOKENS = 64
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / settings.DIFF_CHARS_PER_TOKEN)
+
+
+def encoded_tokens(text: str, encoder: PayloadEncoder) -> int:
+    """Tokens of text once the encoder put it in the payload."""
+    return math.ceil(encoder.text_length(text) / settings.DIFF_CHARS_PER_TOKEN)
+
+
+def hunk_tokens(hunk: Hunk, encoder: PayloadEncoder) -> int:
+    # Plus the newline joining it to the previous hunk
+    return encoded_tokens(hunk.text + "\n", encoder)
+
+
+def diff_token_budget(context_window: int | None) -> int:
+    """Tokens of the context window that the diff payload may use."""
+    context_window = context_window or settings.DEFAULT_CONTEXT_WINDOW
+    budget = int(context_window * settings.DIFF_CONTEXT_SHARE)
+
+    return max(budget - settings.PROMPT_RESERVED_TOKENS, 0)
+
+
+def file_priority(path: str) -> int:
+    name = path.rsplit("/", 1)[-1]
+
+    if any(fnmatch(path, pattern) for pattern in LOW_PRIORITY_PATTERNS):
+        return GENERATED
+    if any(
+        fnmatch(path, pattern) or fnmatch(name, pattern) for pattern in TEST_PATTERNS
+    ):
+        return TEST
+    return SOURCE
+
+
+def truncate_hunk(hunk: Hunk, max_tokens: int, encoder: PayloadEncoder) -> str:
+    """Keep the head of a hunk that doesn't fit in max_tokens."""
+    kept = [hunk.header]
+    used = encoded_tokens(hunk.header, encoder)
+
+    for line in hunk.lines:
+        cost = encoded_tokens(line + "\n", encoder)
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+
+    kept.append(f"... ({len(hunk.lines) + 1 - len(kept)} lines omitted) ...")
+    return "\n".join(kept)
+
+
+def pack_diffs(
+    optimized_diffs: dict, token_budget: int, encoder: PayloadEncoder
+) -> dict:
+    """Fit the diffs of optimized_diffs into token_budget, once encoded.
+
+    Every file keeps its path and stats while they fit. The remaining budget
+    is then filled hunk by hunk, round robin across the files of a priority
+    tier (source, then tests, then generated files), so one big file can't
+    starve the others. Dropped files and hunks are reported in "omitted".
+    """
+    files = optimized_diffs["files_changed"]
+    remaining = (
+        token_budget
+        - PAYLOAD_OVERHEAD_TOKENS
+        - estimate_tokens(json.dumps(optimized_diffs["commits"]))
+    )
+
+    order = sorted(range(len(files)), key=lambda i: file_priority(files[i]["path"]))
+    listed = []
+    path_tokens = {}
+
+    for index in order:
+        path_tokens[index] = encoded_tokens(files[index]["path"], encoder) + 1
+        # Charged twice until a hunk is kept, files without diff are listed
+        # again in the omitted report
+        cost = FILE_OVERHEAD_TOKENS + 2 * path_tokens[index]
+        if cost > remaining:
+            break
+        listed.append(index)
+        remaining -= cost
+
+    kept_hunks = {index: [] for index in listed}
+    truncated = set()
+
+    for tier in (SOURCE, TEST, GENERATED):
+        pending = deque(
+            (index, 0)
+            for index in listed
+            if file_priority(files[index]["path"]) == tier and files[index]["hunks"]
+        )
+
+        while pending and remaining > 0:
+            index, position = pending.popleft()
+            hunk = files[index]["hunks"][position]
+            cost = hunk_tokens(hunk, encoder)
+
+            if cost > remaining:
+                # Show at least the head of the first hunk of every file,
+                # without taking more than its share of what is left
+                share = max(remaining // (len(pending) + 1), MIN_TRUNCATED_HUNK_TOKENS)
+                if position == 0 and remaining >= MIN_TRUNCATED_HUNK_TOKENS:
+                    text = truncate_hunk(hunk, min(share, remaining), encoder)
+                    kept_hunks[index].append(text)
+                    truncated.add(index)
+                    remaining -= encoded_tokens(text + "\n", encoder)
+                    remaining += path_tokens[index]
+                continue
+
+            kept_hunks[index].append(hunk.text)
+            remaining -= cost
+            if position == 0:
+                remaining += path_tokens[index]
+
+            if position + 1 < len(files[index]["hunks"]):
+                pending.append((index, position + 1))
+
+    files_changed = []
+    omitted_files = []
+    omitted_hunks = 0
+
+    for index in listed:
+        file = files[index]
+        hunks = kept_hunks[index]
+        missing = len(file["hunks"]) - len(hunks) + (1 if index in truncated else 0)
+
+        if file["hunks"] and not hunks:
+            omitted_files.append(file["path"])
+        omitted_hunks += missing
+
+        entry = {
+            "path": file["path"],
+            "status": file["status"],
+            "additions": file["additions"],
+            "deletions": file["deletions"],
+            "diff": "\n".join(hunks),
+        }
+        if missing:
+            entry["omitted_hunks"] = missing
+        if file.get("summary"):
+            entry["summary"] = file["summary"]
+        files_changed.append(entry)
+
+    payload = {
+        "commits": optimized_diffs["commits"],
+        "files_changed": files_changed,
+        "total_commits": optimized_diffs["total_commits"],
+        "total_files": optimized_diffs["total_files"],
+    }
+
+    if omitted_files or omitted_hunks or len(listed) < len(files):
+        payload["omitted"] = {
+            "files_without_diff": omitted_files,
+            "hunks": omitted_hunks,
+            "unlisted_files": len(files) - len(listed),
+        }
+
+    return payload
@@ -0,0 +1,149 @@
+import re
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
+HUNK_HEADER = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@ ?([^\n]*)")
+
+
+@dataclass
+class Hunk:
+    header: str
+    old_start: int
+    old_lines: int
+    new_start: int
+    new_lines: int
+    function: str
+    lines: list[str] = field(default_factory=list)
+    added: int = 0
+    removed: int = 0
+    context: int = 0
+
+    @property
+    def text(self) -> str:
+        return "\n".join([self.header, *self.lines])
+
+    @property
+    def added_lines(self) -> list[str]:
+        return [line[1:] for line in self.lines if line.startswith("+")]
+
+    @property
+    def removed_lines(self) -> list[str]:
+        return [line[1:] for line in self.lines if line.startswith("-")]
+
+
+@dataclass
+class ParsedDiff:
+    hunks: list[Hunk]
+    additions: int
+    deletions: int
+
+
+def _count_changes(hunk: Hunk, markers: str) -> tuple[int, int]:
+    """Add the lines of markers to the hunk, return the header counts left."""
+    added = markers.count("+")
+    removed = markers.count("-")
+    context = len(markers) - added - removed - markers.count("\\")
+
+    hunk.added += added
+    hunk.removed += removed
+    hunk.context += context
+
+    return (
+        hunk.old_lines - hunk.removed - hunk.context,
+        hunk.new_lines - hunk.added - hunk.context,
+    )
+
+
+def _find_header(
+    lines: list[str], markers: str, position: int
+) -> tuple[int, re.Match | None]:
+    """Index and match of the first @@ header from position, -1 when none."""
+    position = markers.find("@", position)
+
+    while position != -1:
+        match = HUNK_HEADER.match(lines[position])
+        if match is not None:
+            return position, match
+        position = markers.find("@", position + 1)
+
+    return -1, None
+
+
+def iter_hunks(diff_text: str) -> Iterator[Hunk]:
+    """Yield the hunks of a unified diff as they are found in the text.
+
+    The text is split once and the first character of every line gathered in
+    a single pass, so hunks are delimited and their changes counted with
+    str.find and str.count on those markers instead of line by line. A hunk
+    ends once the line counts of its @@ header are used up, so "+++" or
+    "---" lines inside a hunk count as changes while the file headers that
+    follow it don't.
+    """
+    lines = (diff_text or "").split("\n")
+    # Not the empty string after the final newline
+    last = len(lines) - (lines[-1] == "")
+
+    markers = "".join([line[:1] for line in lines])
+    if len(markers) != last:
+        # Empty lines are context lines that lost their leading space
+        markers = "".join([line[:1] or " " for line in lines])
+    position, match = _find_header(lines, markers, 0)
+
+    while match is not None:
+        old_start, old_lines, new_start, new_lines, function = match.groups()
+        hunk = Hunk(
+            header=match.group(0),
+            old_start=int(old_start),
+            old_lines=1 if old_lines is None else int(old_lines),
+            new_start=int(new_start),
+            new_lines=1 if new_lines is None else int(new_lines),
+            function=function,
+        )
+
+        start = position + 1
+        following, following_match = _find_header(lines, markers, start)
+        limit = last if following == -1 else min(following, last)
+
+        # Usually the whole body up to the next header, followed by at most
+        # two "\ No newline at end of file"
+        body = markers[start:limit]
+        changes = body.rstrip("\\")
+
+        if (
+            len(body) - len(changes) <= 2
+            and "\\" not in changes
+            and _count_changes(hunk, changes) == (0, 0)
+        ):
+            end = limit
+        else:
+            hunk.added = hunk.removed = hunk.context = 0
+            end = start
+            old_remaining, new_remaining = hunk.old_lines, hunk.new_lines
+
+            # Each line uses up at most one line of each count, so the next
+            # max(old_remaining, new_remaining) lines all belong to the hunk
+            while (old_remaining > 0 or new_remaining > 0) and end < limit:
+                step = min(max(old_remaining, new_remaining), limit - end)
+                old_remaining, new_remaining = _count_changes(
+                    hunk, markers[end : end + step]
+                )
+                end += step
+
+            # "\ No newline at end of file" after the last line of the hunk
+            if end < limit and markers[end] == "\\":
+                end += 1
+
+        hunk.lines = lines[start:end]
+
+        yield hunk
+        position, match = following, following_match
+
+
+def parse_diff(diff_text: str) -> ParsedDiff:
+    hunks = list(iter_hunks(diff_text))
+
+    return ParsedDiff(
+        hunks=hunks,
+        additions=sum(hunk.added for hunk in hunks),
+        deletions=sum(hunk.removed for hunk in hunks),
+    )
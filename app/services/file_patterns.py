@@ -0,0 +1,45 @@
+"""Path globs shared by the diff filter and the diff packer."""
+
+LOCKFILE_PATTERNS = [
+    "*.lock",
+    "*-lock.json",
+    "*package-lock.json",
+    "*npm-shrinkwrap.json",
+    "*yarn.lock",
+    "*pnpm-lock.yaml",
+    "*poetry.lock",
+    "*Pipfile.lock",
+    "*uv.lock",
+    "*Cargo.lock",
+    "*Gemfile.lock",
+    "*composer.lock",
+    "*go.sum",
+    "*mix.lock",
+    "*pubspec.lock",
+    "*packages.lock.json",
+]
+
+VENDORED_PATTERNS = [
+    "vendor/*",
+    "*/vendor/*",
+    "third_party/*",
+    "*/third_party/*",
+    "node_modules/*",
+    "*/node_modules/*",
+]
+
+GENERATED_PATTERNS = [
+    "*.min.js",
+    "*.min.css",
+    "*.map",
+    "*.snap",
+    "*/__snapshots__/*",
+    "*_pb2.py",
+    "*_pb2_grpc.py",
+    "*.pb.go",
+    "*.generated.*",
+    "*/generated/*",
+    "dist/*",
+    "*/dist/*",
+    "build/*",
+]
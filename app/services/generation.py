@@ -0,0 +1,608 @@
+import asyncio
+import math
+from collections.abc import AsyncIterator
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.status import (
+    HTTP_400_BAD_REQUEST,
+    HTTP_401_UNAUTHORIZED,
+    HTTP_404_NOT_FOUND,
+    HTTP_500_INTERNAL_SERVER_ERROR,
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
+
+from app.core.config import settings
+from app.core.metrics import Counter, Histogram
+from app.core.tracing import span
+from app.db.session import SessionLocal
+from app.models.ai_models import AI_Models
+from app.models.ai_providers import AI_Providers, ProvidersTypes
+from app.models.templates import Templates
+from app.schemas.merge_request import MergeRequestDataAiInput, MergeRequestInfoResponse
+from app.services.catalog_cache import get_generation_rows
+from app.services.compare_cache import compare_cache
+from app.services.diff_filters import filter_noise, get_filter_rules
+from app.services.diff_packer import diff_token_budget, pack_diffs
+from app.services.diff_parser import parse_diff
+from app.services.generation_cache import (
+    generation_cache_key,
+    get_cached_generation,
+    save_cached_generation,
+)
+from app.services.gitlab_gateway import GitlabError, GitlabGateway, gitlab_sessions
+from app.services.llm_providers import get_llm_provider
+from app.services.llm_router import llm_router
+from app.services.llm_scheduler import SchedulerBusy
+from app.services.map_reduce import chunk_files, map_reduce_diffs
+from app.services.mr_output import (
+    DESCRIPTION_END,
+    DESCRIPTION_START,
+    TITLE_END,
+    TITLE_START,
+    MergeRequestStreamParser,
+    extract_section,
+)
+from app.services.payload_encoders import get_payload_encoder
+from app.services.prompts import (
+    SYSTEM_PROMPT,
+    prompt_cache_key,
+    request_block,
+    template_block,
+)
+from app.services.retry import is_retryable, retry_after_of
+from app.services.single_flight import SingleFlight
+
+# Identical generations running at the same time share a single llm call
+generation_flight = SingleFlight("generation")
+
+STAGE_SECONDS = Histogram(
+    "generation_stage_seconds",
+    "Time spent in each stage of a generation",
+    ("stage",),
+)
+GENERATIONS = Counter(
+    "generations_total",
+    "Generations by provider, model and outcome (ok, cached or the error status,"
+    " 499 when a streaming client went away)",
+    ("provider", "model", "outcome"),
+)
+DIFF_BYTES = Counter(
+    "generation_diff_bytes_total",
+    "Bytes of diff fetched from gitlab (raw) and sent in the prompt (prompt)",
+    ("provider", "model", "kind"),
+)
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """Time a stage of the generation, in the histogram and as a span."""
+    with span(name, **attributes) as current, STAGE_SECONDS.time(stage=name):
+        yield current
+
+
+def build_mr_messages(
+    diffs: str,
+    template: str,
+    title: str,
+    user_context: str,
+) -> list[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": template_block(title, template)
+            + request_block(diffs, user_context),
+        },
+    ]
+
+
+def is_complete_mr_output(content: str) -> bool:
+    return (
+        extract_section(content, TITLE_START, TITLE_END) is not None
+        and extract_section(content, DESCRIPTION_START, DESCRIPTION_END) is not None
+    )
+
+
+def llm_busy_error(retry_after: float | None = None) -> HTTPException:
+    return HTTPException(
+        status_code=HTTP_503_SERVICE_UNAVAILABLE,
+        detail="The ai api provider is busy. Try again later",
+        headers={"Retry-After": str(max(math.ceil(retry_after or 5), 1))},
+    )
+
+
+def llm_call_error(error: Exception) -> HTTPException:
+    """The http error for a failed llm call, once the retries gave up."""
+    if isinstance(error, SchedulerBusy):
+        return llm_busy_error()
+
+    # Rate limits (429) and provider outages are worth retrying later
+    if is_retryable(error):
+        return llm_busy_error(retry_after_of(error))
+
+    return HTTPException(
+        status_code=HTTP_500_INTERNAL_SERVER_ERROR,
+        detail="Error calling ai api provider. Try again later",
+    )
+
+
+async def get_ai_mr_data(
+    diffs: str,
+    template: str,
+    title: str,
+    user_context: str,
+    provider_type: ProvidersTypes,
+    model: str,
+):
+    messages = build_mr_messages(diffs, template, title, user_context)
+
+    try:
+        with stage("llm", provider=provider_type.value, model=model):
+            return await llm_router.complete(
+                llm_router.routes(provider_type, model),
+                messages,
+                prompt_cache_key(title, template),
+                is_valid=is_complete_mr_output,
+            )
+    except Exception as error:
+        raise llm_call_error(error) from error
+
+
+def build_optimized_diffs(compare):
+    files_changed = []
+
+    for diff in compare["diffs"]:
+        diff_text = diff.get("diff", "")
+        parsed = parse_diff(diff_text)
+        files_changed.append(
+            {
+                "path": diff["new_path"],
+                "status": (
+                    "deleted"
+                    if diff["deleted_file"]
+                    else "new" if diff["new_file"] else "modified"
+                ),
+                "additions": parsed.additions,
+                "deletions": parsed.deletions,
+                "hunks": parsed.hunks,
+                "bytes": len(diff_text),
+                "binary": bool(diff_text) and not parsed.hunks,
+                "generated": diff.get("generated_file", False),
+                "too_large": diff.get("too_large", False),
+            }
+        )
+
+    return {
+        "commits": [
+            {
+                "message": commit["message"],
+                "author": commit["author_name"],
+                "timestamp": commit["created_at"],
+            }
+            for commit in compare["commits"]
+        ],
+        "files_changed": files_changed,
+        "total_commits": len(compare["commits"]),
+        "total_files": len(compare["diffs"]),
+    }
+
+
+async def get_gitlab_project(gateway: GitlabGateway, project_id: int) -> dict:
+    try:
+        with stage("gitlab_project", project_id=project_id):
+            return await gateway.get_project(project_id)
+    except GitlabError as error:
+        if error.status_code == HTTP_401_UNAUTHORIZED:
+            raise HTTPException(
+                status_code=HTTP_401_UNAUTHORIZED,
+                detail="Invalida gitlab personal access token",
+            )
+        if error.status_code == HTTP_404_NOT_FOUND:
+            raise HTTPException(
+                status_code=HTTP_404_NOT_FOUND,
+                detail=f"Project with id:{project_id} was not found",
+            )
+        raise HTTPException(
+            status_code=error.status_code, detail="Error obtaining the project"
+        )
+
+
+async def get_generation_context(
+    db: AsyncSession, merge_request_input: MergeRequestDataAiInput
+):
+    with stage(
+        "catalog",
+        provider_id=merge_request_input.provider_id,
+        model=merge_request_input.model,
+        template_id=merge_request_input.template_id,
+    ):
+        provider, model, template = await get_generation_rows(
+            db,
+            merge_request_input.provider_id,
+            merge_request_input.model,
+            merge_request_input.template_id,
+        )
+
+    if provider is None:
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND,
+            detail=f"Provider with id: {merge_request_input.provider_id} not found",
+        )
+
+    if model is None:
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND,
+            detail=f"Model {merge_request_input.model} not found",
+        )
+
+    if model.provider_id != provider.id:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=f"The Model {merge_request_input.model} is not from the Provider{provider.name}",
+        )
+
+    if template is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Template not found")
+
+    return provider, model, template
+
+
+async def resolve_branch_heads(
+    gateway: GitlabGateway, merge_request_input: MergeRequestDataAiInput
+) -> tuple[int, str, str]:
+    """Project id plus the target (base) and origin (head) commit SHAs."""
+    project = await get_gitlab_project(gateway, merge_request_input.project_id)
+
+    try:
+        with stage("gitlab_branches"):
+            base_sha, head_sha = await asyncio.gather(
+                gateway.get_branch_sha(
+                    project["id"], merge_request_input.target_branch
+                ),
+                gateway.get_branch_sha(
+                    project["id"], merge_request_input.origin_branch
+                ),
+            )
+    except GitlabError as error:
+        if error.status_code == HTTP_404_NOT_FOUND:
+            raise HTTPException(
+                status_code=HTTP_404_NOT_FOUND,
+                detail=f"Branch not found {error.message}",
+            )
+        raise HTTPException(
+            status_code=error.status_code,
+            detail=f"Error obtaining the branches {error.message}",
+        )
+
+    return project["id"], base_sha, head_sha
+
+
+async def get_compare(
+    gateway: GitlabGateway, project_id: int, base_sha: str, head_sha: str
+) -> dict:
+    try:
+        with stage("gitlab_compare", project_id=project_id):
+            return await gateway.compare(project_id, base_sha, head_sha)
+    except GitlabError as error:
+        raise HTTPException(
+            status_code=error.status_code,
+            detail=f"Error comparing branches {error.message}",
+        )
+
+
+async def get_optimized_diffs(
+    gateway: GitlabGateway, project_id: int, base_sha: str, head_sha: str
+) -> dict:
+    async def load():
+        compare = await get_compare(gateway, project_id, base_sha, head_sha)
+        with stage("build_optimized_diffs") as current:
+            optimized_diffs = build_optimized_diffs(compare)
+            current.set(
+                files=optimized_diffs["total_files"],
+                diff_bytes=sum(
+                    file["bytes"] for file in optimized_diffs["files_changed"]
+                ),
+            )
+            return optimized_diffs
+
+    return await compare_cache.get_or_load((project_id, base_sha, head_sha), load)
+
+
+async def build_diff_text(
+    optimized_diffs: dict,
+    provider_type: ProvidersTypes,
+    model: AI_Models,
+    template: Templates,
+    user_context: str,
+) -> str:
+    if settings.DIFF_FILTER_ENABLED:
+        optimized_diffs = filter_noise(
+            optimized_diffs, get_filter_rules(template.diff_filters)
+        )
+
+    token_budget = diff_token_budget(model.context_window)
+    encoder = get_payload_encoder(model.payload_encoding)
+    packed = pack_diffs(optimized_diffs, token_budget, encoder)
+
+    if "omitted" in packed and settings.MAP_REDUCE_ENABLED:
+        chunks = chunk_files(optimized_diffs, token_budget, encoder)
+        if len(chunks) > 1:
+            try:
+                packed = await map_reduce_diffs(
+                    optimized_diffs,
+                    chunks,
+                    token_budget,
+                    provider_type,
+                    model.name,
+                    user_context,
+                    encoder,
+                )
+            except Exception as error:
+                raise llm_call_error(error) from error
+
+    diff_text = encoder.encode(packed)
+
+    labels = {"provider": provider_type.value, "model": model.name}
+    DIFF_BYTES.inc(
+        sum(file["bytes"] for file in optimized_diffs["files_changed"]),
+        kind="raw",
+        **labels,
+    )
+    DIFF_BYTES.inc(len(diff_text), kind="prompt", **labels)
+
+    return diff_text
+
+
+async def run_generation(
+    db: AsyncSession,
+    merge_request_input: MergeRequestDataAiInput,
+    provider: AI_Providers,
+    model: AI_Models,
+    template: Templates,
+) -> MergeRequestInfoResponse:
+    labels = {"provider": provider.type.value, "model": model.name}
+
+    try:
+        with span("generation", **labels) as current:
+            result, outcome = await generate_merge_request_info(
+                db, merge_request_input, provider, model, template
+            )
+            current.set(outcome=outcome)
+    except HTTPException as error:
+        GENERATIONS.inc(outcome=str(error.status_code), **labels)
+        raise
+    except Exception:
+        GENERATIONS.inc(outcome=str(HTTP_500_INTERNAL_SERVER_ERROR), **labels)
+        raise
+
+    GENERATIONS.inc(outcome=outcome, **labels)
+
+    return result
+
+
+async def generate_merge_request_info(
+    db: AsyncSession,
+    merge_request_input: MergeRequestDataAiInput,
+    provider: AI_Providers,
+    model: AI_Models,
+    template: Templates,
+) -> tuple[MergeRequestInfoResponse, str]:
+    gateway = gitlab_sessions.get(merge_request_input.pat)
+    project_id, base_sha, head_sha = await resolve_branch_heads(
+        gateway, merge_request_input
+    )
+
+    cache_key = generation_cache_key(
+        project_id,
+        base_sha,
+        head_sha,
+        template,
+        model.name,
+        merge_request_input.context_ai,
+    )
+
+    if not merge_request_input.force_refresh:
+        with stage("generation_cache") as current:
+            cached = await get_cached_generation(db, cache_key)
+            current.set(hit=cached is not None)
+        if cached is not None:
+            title, description = cached
+            return (
+                MergeRequestInfoResponse(title=title, description=description),
+                "cached",
+            )
+
+    async def generate() -> MergeRequestInfoResponse:
+        optimized_diffs = await get_optimized_diffs(
+            gateway, project_id, base_sha, head_sha
+        )
+
+        with stage("build_prompt", model=model.name) as current:
+            diff_text = await build_diff_text(
+                optimized_diffs,
+                provider.type,
+                model,
+                template,
+                merge_request_input.context_ai,
+            )
+            current.set(prompt_bytes=len(diff_text))
+
+        mr_data = await get_ai_mr_data(
+            diff_text,
+            template.template,
+            template.title,
+            merge_request_input.context_ai,
+            provider.type,
+            model.name,
+        )
+
+        if mr_data is None:
+            raise HTTPException(
+                status_code=HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error calling ai api provider. Try again later",
+            )
+
+        with stage("extract_section"):
+            title = extract_section(mr_data, TITLE_START, TITLE_END)
+            description = extract_section(mr_data, DESCRIPTION_START, DESCRIPTION_END)
+
+        if title is not None and description is not None:
+            async with SessionLocal() as session:
+                await save_cached_generation(session, cache_key, title, description)
+
+        return MergeRequestInfoResponse(
+            title=title,
+            description=description,
+        )
+
+    return await generation_flight.do(cache_key, generate), "ok"
+
+
+async def stream_generation(
+    db: AsyncSession,
+    merge_request_input: MergeRequestDataAiInput,
+    provider: AI_Providers,
+    model: AI_Models,
+    template: Templates,
+) -> AsyncIterator[tuple[str, dict]]:
+    """run_generation as (event, data) pairs, streaming the tokens as they come.
+
+    Yields `title`, `description` (with the new text) and a final `done`
+    event. It takes part in the same single-flight group: a stream joining
+    a generation already running gets the whole result at once. Errors
+    raised before the first event are the same HTTPExceptions as in
+    run_generation.
+    """
+    labels = {"provider": provider.type.value, "model": model.name}
+    outcome = "ok"
+
+    try:
+        gateway = gitlab_sessions.get(merge_request_input.pat)
+        project_id, base_sha, head_sha = await resolve_branch_heads(
+            gateway, merge_request_input
+        )
+
+        cache_key = generation_cache_key(
+            project_id,
+            base_sha,
+            head_sha,
+            template,
+            model.name,
+            merge_request_input.context_ai,
+        )
+
+        cached = None
+        if not merge_request_input.force_refresh:
+            with stage("generation_cache") as current:
+                cached = await get_cached_generation(db, cache_key)
+                current.set(hit=cached is not None)
+
+        if cached is not None:
+            outcome = "cached"
+            title, description = cached
+            yield "title", {"title": title}
+            yield "description", {"delta": description}
+            yield "done", {"title": title, "description": description}
+            return
+
+        deltas: asyncio.Queue[tuple[str, dict]] = asyncio.Queue()
+
+        async def generate() -> MergeRequestInfoResponse:
+            optimized_diffs = await get_optimized_diffs(
+                gateway, project_id, base_sha, head_sha
+            )
+
+            with stage("build_prompt", model=model.name) as current:
+                diff_text = await build_diff_text(
+                    optimized_diffs,
+                    provider.type,
+                    model,
+                    template,
+                    merge_request_input.context_ai,
+                )
+                current.set(prompt_bytes=len(diff_text))
+
+            messages = build_mr_messages(
+                diff_text,
+                template.template,
+                template.title,
+                merge_request_input.context_ai,
+            )
+            # No hedging once tokens are sent, but an open breaker still fails over
+            provider_type, model_name = llm_router.routes(provider.type, model.name)[0]
+            parser = MergeRequestStreamParser()
+
+            try:
+                with stage("llm", provider=provider_type.value, model=model_name):
+                    async for delta in get_llm_provider(provider_type).stream(
+                        model_name,
+                        messages,
+                        prompt_cache_key(template.title, template.template),
+                    ):
+                        for event, text in parser.feed(delta):
+                            if event == "title":
+                                deltas.put_nowait(("title", {"title": text}))
+                            else:
+                                deltas.put_nowait(("description", {"delta": text}))
+            except Exception as error:
+                raise llm_call_error(error) from error
+
+            title, description = parser.result()
+            if title is None or description is None:
+                raise HTTPException(
+                    status_code=HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Error calling ai api provider. Try again later",
+                )
+
+            async with SessionLocal() as session:
+                await save_cached_generation(session, cache_key, title, description)
+
+            return MergeRequestInfoResponse(title=title, description=description)
+
+        # Only the leader's generate fills deltas, a coalesced stream just
+        # waits for the result
+        flight = asyncio.ensure_future(generation_flight.do(cache_key, generate))
+        streamed = False
+
+        try:
+            while not flight.done() or not deltas.empty():
+                if deltas.empty():
+                    getter = asyncio.ensure_future(deltas.get())
+                    try:
+                        await asyncio.wait(
+                            {getter, flight}, return_when=asyncio.FIRST_COMPLETED
+                        )
+                    finally:
+                        received = getter.done()
+                        getter.cancel()
+                    if not received:
+                        continue
+                    event = getter.result()
+                else:
+                    event = deltas.get_nowait()
+
+                streamed = True
+                yield event
+
+            result = flight.result()
+        finally:
+            # Cancels the shared work too when no other caller waits for it
+            flight.cancel()
+
+        if not streamed:
+            yield "title", {"title": result.title}
+            yield "description", {"delta": result.description}
+        yield "done", result.model_dump()
+    except HTTPException as error:
+        outcome = str(error.status_code)
+        raise
+    except (GeneratorExit, asyncio.CancelledError):
+        outcome = "499"
+        raise
+    except Exception:
+        outcome = str(HTTP_500_INTERNAL_SERVER_ERROR)
+        raise
+    finally:
+        GENERATIONS.inc(outcome=outcome, **labels)
@@ -0,0 +1,83 @@
+import datetime
+import hashlib
+import json
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.models.templates import Templates
+from app.repositories import generation_cache
+from app.services.ttl_cache import TTLCache
+
+GENERATION_CACHE_LOOKUPS = Counter(
+    "generation_cache_lookups_total",
+    "Generation cache lookups, by the tier that answered or miss",
+    ("result",),
+)
+
+memory_cache = TTLCache(
+    settings.GENERATION_CACHE_TTL_SECONDS, settings.GENERATION_CACHE_SIZE
+)
+
+
+def generation_cache_key(
+    project_id: int,
+    base_sha: str,
+    head_sha: str,
+    template: Templates,
+    model_name: str,
+    context_ai: str,
+) -> str:
+    """Content address of a generation: same inputs, same title/description."""
+    payload = json.dumps(
+        [
+            project_id,
+            base_sha,
+            head_sha,
+            template.id,
+            template.updated_at.isoformat() if template.updated_at else None,
+            model_name,
+            context_ai,
+        ]
+    )
+
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def get_cached_generation(
+    db: AsyncSession, key: str
+) -> tuple[str, str] | None:
+    cached = memory_cache.get(key)
+    if cached is not None:
+        GENERATION_CACHE_LOOKUPS.inc(result="memory")
+        return cached
+
+    if not settings.GENERATION_CACHE_DB_ENABLED:
+        GENERATION_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    row = await generation_cache.get_generation(db, key)
+    if row is None:
+        GENERATION_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    GENERATION_CACHE_LOOKUPS.inc(result="database")
+    cached = (row.title, row.description)
+    memory_cache.set(key, cached)
+
+    return cached
+
+
+async def save_cached_generation(
+    db: AsyncSession, key: str, title: str, description: str
+):
+    memory_cache.set(key, (title, description))
+
+    if settings.GENERATION_CACHE_DB_ENABLED:
+        expires_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+            seconds=settings.GENERATION_CACHE_DB_TTL_SECONDS
+        )
+        await generation_cache.save_generation(
+            db, key, title, description, expires_at
+        )
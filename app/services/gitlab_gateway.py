@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import weakref
+from collections import OrderedDict
+from urllib.parse import quote
+
+import httpx
+
+from app.core.config import settings
+from app.services.retry import (
+    RetryPolicy,
+    is_retryable,
+    is_retryable_unsent,
+    parse_retry_after,
+    retry_call,
+)
+from app.services.ttl_cache import TTLCache
+
+GITLAB_RETRY = RetryPolicy(
+    "gitlab",
+    settings.GITLAB_RETRY_ATTEMPTS,
+    settings.RETRY_BASE_DELAY_SECONDS,
+    settings.RETRY_MAX_DELAY_SECONDS,
+    settings.GITLAB_RETRY_DEADLINE_SECONDS,
+)
+
+
+class GitlabError(Exception):
+    def __init__(
+        self, status_code: int, message: str, retry_after: float | None = None
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after
+
+
+class GitlabGateway:
+    """Async access to the GitLab REST api through a pooled session."""
+
+    def __init__(self, session_key: str, client: httpx.AsyncClient):
+        self.session_key = session_key
+        self.client = client
+
+    async def _send(self, method: str, path: str, **kwargs):
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as error:
+            raise GitlabError(502, f"Error calling gitlab: {error}") from error
+
+        if response.is_error:
+            try:
+                message = response.json().get("message", response.text)
+            except ValueError:
+                message = response.text
+            raise GitlabError(
+                response.status_code,
+                str(message),
+                parse_retry_after(response.headers.get("retry-after")),
+            )
+
+        return response.json()
+
+    async def _request(self, method: str, path: str, retryable=is_retryable, **kwargs):
+        return await retry_call(
+            GITLAB_RETRY, lambda: self._send(method, path, **kwargs), retryable
+        )
+
+    async def get_project(self, project_id: int) -> dict:
+        cache_key = (self.session_key, project_id)
+        project = project_cache.get(cache_key)
+
+        if project is None:
+            project = await self._request("GET", f"/projects/{project_id}")
+            project_cache.set(cache_key, project)
+
+        return project
+
+    async def get_branch_sha(self, project_id: int, branch: str) -> str:
+        branch = await self._request(
+            "GET",
+            f"/projects/{project_id}/repository/branches/{quote(branch, safe='')}",
+        )
+
+        return branch["commit"]["id"]
+
+    async def compare(self, project_id: int, from_ref: str, to_ref: str) -> dict:
+        return await self._request(
+            "GET",
+            f"/projects/{project_id}/repository/compare",
+            params={"from": from_ref, "to": to_ref},
+        )
+
+    async def create_merge_request(self, project_id: int, data: dict) -> dict:
+        # Not idempotent, only retried when gitlab surely didn't get it
+        return await self._request(
+            "POST",
+            f"/projects/{project_id}/merge_requests",
+            retryable=is_retryable_unsent,
+            json=data,
+        )
+
+
+project_cache = TTLCache(
+    settings.GITLAB_PROJECT_CACHE_TTL_SECONDS, settings.GITLAB_PROJECT_CACHE_SIZE
+)
+
+
+class GitlabSession:
+    """A pooled client and the number of gateways still using it."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.users = 0
+        self.evicted = False
+
+
+class GitlabSessions:
+    """Pooled http sessions keyed by a hash of the instance url and the PAT.
+
+    The least recently used sessions are evicted once more than
+    GITLAB_MAX_SESSIONS different tokens are in use. An evicted client is
+    only closed once the last gateway holding it is gone, so requests in
+    the middle of their GitLab calls are not cut off.
+    """
+
+    def __init__(self):
+        self._sessions: OrderedDict[str, GitlabSession] = OrderedDict()
+        self._draining: set[GitlabSession] = set()
+        self._closing: set[asyncio.Task] = set()
+
+    @staticmethod
+    def session_key(base_url: str, pat: str) -> str:
+        return hashlib.sha256(f"{base_url}\0{pat}".encode()).hexdigest()
+
+    def _build_client(self, base_url: str, pat: str) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=f"{base_url.rstrip('/')}/api/v4",
+            headers={"PRIVATE-TOKEN": pat},
+            timeout=httpx.Timeout(
+                settings.GITLAB_TIMEOUT_SECONDS,
+                connect=settings.GITLAB_CONNECT_TIMEOUT_SECONDS,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.GITLAB_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GITLAB_MAX_CONNECTIONS,
+            ),
+        )
+
+    def get(self, pat: str, base_url: str | None = None) -> GitlabGateway:
+        base_url = base_url or settings.GITLAB_URL
+        key = self.session_key(base_url, pat)
+        session = self._sessions.get(key)
+
+        if session is None:
+            session = GitlabSession(self._build_client(base_url, pat))
+            self._sessions[key] = session
+
+            while len(self._sessions) > settings.GITLAB_MAX_SESSIONS:
+                _, evicted = self._sessions.popitem(last=False)
+                evicted.evicted = True
+                if evicted.users == 0:
+                    self._close(evicted)
+                else:
+                    self._draining.add(evicted)
+
+        self._sessions.move_to_end(key)
+
+        gateway = GitlabGateway(key, session.client)
+        session.users += 1
+        weakref.finalize(gateway, self._release, session)
+
+        return gateway
+
+    def _release(self, session: GitlabSession):
+        session.users -= 1
+        if session.evicted and session.users == 0 and session in self._draining:
+            self._draining.discard(session)
+            self._close(session)
+
+    def _close(self, session: GitlabSession):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Outside of the loop, e.g. during shutdown: aclose takes care of it
+            self._draining.add(session)
+            return
+
+        task = loop.create_task(session.client.aclose())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def aclose(self):
+        sessions = [*self._sessions.values(), *self._draining]
+        self._sessions.clear()
+        self._draining.clear()
+
+        for session in sessions:
+            await session.client.aclose()
+        await asyncio.gather(*self._closing, return_exceptions=True)
+
+
+gitlab_sessions = GitlabSessions()
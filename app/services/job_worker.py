@@ -0,0 +1,187 @@
+import asyncio
+import datetime
+import uuid
+
+from cryptography.fernet import Fernet, InvalidToken
+from fastapi import HTTPException
+from starlette.status import HTTP_429_TOO_MANY_REQUESTS
+
+from app.core.config import settings
+from app.core.tracing import start_trace
+from app.db.session import SessionLocal
+from app.repositories import generation_jobs
+from app.schemas.merge_request import MergeRequestDataAiInput
+from app.services.generation import get_generation_context, run_generation
+from app.services.llm_scheduler import PRIORITY_BACKGROUND, llm_priority
+
+# The pat of a queued job is only stored encrypted
+_payload_cipher = Fernet(settings.JOB_PAYLOAD_KEY or Fernet.generate_key())
+
+
+def seal_job_payload(merge_request_input: MergeRequestDataAiInput) -> dict:
+    payload = merge_request_input.model_dump()
+    payload["pat"] = _payload_cipher.encrypt(payload["pat"].encode()).decode()
+    return payload
+
+
+def open_job_payload(payload: dict) -> MergeRequestDataAiInput:
+    pat = _payload_cipher.decrypt(payload["pat"].encode()).decode()
+    return MergeRequestDataAiInput(**{**payload, "pat": pat})
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, HTTPException):
+        return (
+            error.status_code >= 500 or error.status_code == HTTP_429_TOO_MANY_REQUESTS
+        )
+    return True
+
+
+def retry_delay(attempts: int) -> datetime.timedelta:
+    return datetime.timedelta(
+        seconds=settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)
+    )
+
+
+async def run_job(job_id: uuid.UUID, payload: dict, attempts: int):
+    try:
+        merge_request_input = open_job_payload(payload)
+    except InvalidToken:
+        async with SessionLocal() as session:
+            await generation_jobs.fail_job(
+                session,
+                job_id,
+                attempts,
+                "The job was queued with another JOB_PAYLOAD_KEY",
+            )
+        return
+
+    llm_priority.set(PRIORITY_BACKGROUND)
+    beat = asyncio.create_task(heartbeat(job_id, attempts))
+
+    try:
+        with start_trace("generation job", job_id=str(job_id), attempts=attempts):
+            await run_claimed_job(job_id, merge_request_input, attempts)
+    finally:
+        beat.cancel()
+
+
+async def heartbeat(job_id: uuid.UUID, attempts: int):
+    """Keep the lock of a running job fresh, so the sweeper leaves it alone."""
+    while True:
+        await asyncio.sleep(settings.JOB_LOCK_TIMEOUT_SECONDS / 3)
+        try:
+            async with SessionLocal() as session:
+                await generation_jobs.touch_job(session, job_id, attempts)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Database unavailable, the next beat tries again
+            pass
+
+
+async def run_claimed_job(
+    job_id: uuid.UUID, merge_request_input: MergeRequestDataAiInput, attempts: int
+):
+    async with SessionLocal() as session:
+        try:
+            context = await get_generation_context(session, merge_request_input)
+            result = await run_generation(session, merge_request_input, *context)
+        except Exception as error:
+            detail = (
+                error.detail
+                if isinstance(error, HTTPException)
+                else "Error generating the merge request data"
+            )
+            retry_in = None
+            if is_retryable(error) and attempts < settings.JOB_MAX_ATTEMPTS:
+                retry_in = retry_delay(attempts)
+
+            await session.rollback()
+            await generation_jobs.fail_job(
+                session, job_id, attempts, str(detail), retry_in
+            )
+            return
+
+        await generation_jobs.complete_job(
+            session, job_id, attempts, result.model_dump()
+        )
+
+
+class JobWorkerPool:
+    """In-process workers draining the generation_jobs table.
+
+    Jobs are claimed with FOR UPDATE SKIP LOCKED, so every replica of the api
+    can run its own pool against the same table.
+    """
+
+    def __init__(self):
+        self.tasks: list[asyncio.Task] = []
+        self.stopping = asyncio.Event()
+
+    def start(self):
+        if settings.JOB_WORKERS <= 0:
+            return
+
+        self.stopping.clear()
+        self.tasks = [
+            asyncio.create_task(self.work()) for _ in range(settings.JOB_WORKERS)
+        ]
+        self.tasks.append(asyncio.create_task(self.sweep()))
+
+    async def aclose(self):
+        self.stopping.set()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def wait(self, seconds: float):
+        try:
+            await asyncio.wait_for(self.stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def work(self):
+        while not self.stopping.is_set():
+            try:
+                async with SessionLocal() as session:
+                    job = await generation_jobs.claim_job(
+                        session, settings.JOB_MAX_ATTEMPTS
+                    )
+
+                if job is None:
+                    await self.wait(settings.JOB_POLL_INTERVAL_SECONDS)
+                    continue
+
+                await run_job(job.id, job.payload, job.attempts)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Database unavailable, back off and keep the worker alive
+                await self.wait(settings.JOB_POLL_INTERVAL_SECONDS)
+
+    async def sweep(self):
+        while not self.stopping.is_set():
+            now = datetime.datetime.now(datetime.timezone.utc)
+            locked_before = now - datetime.timedelta(
+                seconds=settings.JOB_LOCK_TIMEOUT_SECONDS
+            )
+            delete_before = now - datetime.timedelta(
+                seconds=settings.JOB_RETENTION_SECONDS
+            )
+
+            try:
+                async with SessionLocal() as session:
+                    await generation_jobs.expire_jobs(
+                        session, settings.JOB_MAX_ATTEMPTS, locked_before, delete_before
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+
+            await self.wait(settings.JOB_SWEEP_INTERVAL_SECONDS)
+
+
+job_workers = JobWorkerPool()
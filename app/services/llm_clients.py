@@ -0,0 +1,102 @@
+import importlib.util
+
+import httpx
+from cerebras.cloud.sdk import AsyncCerebras
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.models.ai_providers import ProvidersTypes
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=settings.LLM_HTTP2 and _http2_available(),
+        timeout=httpx.Timeout(
+            settings.LLM_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    )
+
+
+def _build_open_router_client(api_key: str) -> AsyncOpenAI:
+    return AsyncOpenAI(
+        base_url=settings.OPEN_ROUTER_BASE_URL,
+        api_key=api_key,
+        http_client=_build_http_client(),
+        # Retried with the shared policy in app/services/retry.py instead
+        max_retries=0,
+    )
+
+
+def _build_cerebras_client(api_key: str) -> AsyncCerebras:
+    # The warm up request is made with a blocking client, and a long-lived
+    # pool keeps the connection warm anyway.
+    return AsyncCerebras(
+        base_url=settings.CEREBRAS_BASE_URL,
+        api_key=api_key,
+        http_client=_build_http_client(),
+        max_retries=0,
+        warm_tcp_connection=False,
+    )
+
+
+CLIENT_BUILDERS = {
+    ProvidersTypes.open_router: (_build_open_router_client, "OPEN_ROUTER_API_KEY"),
+    ProvidersTypes.cerebras: (_build_cerebras_client, "CEREBRAS_API_KEY"),
+}
+
+
+def get_api_key(provider_type: ProvidersTypes) -> str:
+    return getattr(settings, CLIENT_BUILDERS[provider_type][1])
+
+
+class LLMClientRegistry:
+    """Process-wide SDK clients keyed by provider type and api key.
+
+    Every client owns its own keep-alive connection pool, so reusing them
+    saves the TCP/TLS handshake and DNS lookup on every completion.
+    """
+
+    def __init__(self):
+        self._clients: dict[tuple[ProvidersTypes, str], AsyncOpenAI | AsyncCerebras] = {}
+
+    def get(
+        self, provider_type: ProvidersTypes, api_key: str
+    ) -> AsyncOpenAI | AsyncCerebras:
+        key = (provider_type, api_key)
+        client = self._clients.get(key)
+
+        if client is None:
+            if provider_type not in CLIENT_BUILDERS:
+                raise ValueError(f"Unsupported provider type: {provider_type}")
+
+            build_client, _ = CLIENT_BUILDERS[provider_type]
+            client = build_client(api_key)
+            self._clients[key] = client
+
+        return client
+
+    def start(self):
+        """Build the clients of every provider with a configured api key."""
+        for provider_type in CLIENT_BUILDERS:
+            api_key = get_api_key(provider_type)
+            if api_key:
+                self.get(provider_type, api_key)
+
+    async def aclose(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+
+        for client in clients:
+            await client.close()
+
+
+llm_clients = LLMClientRegistry()
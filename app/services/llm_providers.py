@@ -0,0 +1,177 @@
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack
+
+from starlette.status import HTTP_429_TOO_MANY_REQUESTS
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.core.tracing import set_span_attributes
+from app.models.ai_providers import ProvidersTypes
+from app.services.llm_clients import get_api_key, llm_clients
+from app.services.llm_scheduler import estimate_request_tokens, llm_scheduler
+from app.services.retry import RetryPolicy, retry_call
+
+LLM_RETRY = RetryPolicy(
+    "llm",
+    settings.LLM_RETRY_ATTEMPTS,
+    settings.RETRY_BASE_DELAY_SECONDS,
+    settings.RETRY_MAX_DELAY_SECONDS,
+    settings.LLM_RETRY_DEADLINE_SECONDS,
+)
+
+LLM_PROMPT_TOKENS = Counter(
+    "llm_prompt_tokens_total",
+    "Prompt tokens sent to the providers, split in cached and uncached.",
+    ("provider", "model", "cache"),
+)
+LLM_COMPLETION_TOKENS = Counter(
+    "llm_completion_tokens_total",
+    "Completion tokens returned by the providers.",
+    ("provider", "model"),
+)
+
+
+def record_usage(provider_type: ProvidersTypes, model: str, usage):
+    if usage is None:
+        return
+
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) or 0
+
+    LLM_PROMPT_TOKENS.inc(
+        cached_tokens, provider=provider_type.value, model=model, cache="hit"
+    )
+    LLM_PROMPT_TOKENS.inc(
+        prompt_tokens - cached_tokens,
+        provider=provider_type.value,
+        model=model,
+        cache="miss",
+    )
+    LLM_COMPLETION_TOKENS.inc(
+        getattr(usage, "completion_tokens", None) or 0,
+        provider=provider_type.value,
+        model=model,
+    )
+    set_span_attributes(
+        prompt_tokens=prompt_tokens,
+        cached_tokens=cached_tokens,
+        completion_tokens=getattr(usage, "completion_tokens", None) or 0,
+    )
+
+
+class LLMProvider:
+    """Shared interface for the chat completion providers we support.
+
+    Both providers expose an OpenAI compatible chat completions api, the
+    subclasses only pick the client.
+    """
+
+    provider_type: ProvidersTypes
+
+    def __init__(self, api_key: str):
+        self.client = llm_clients.get(self.provider_type, api_key)
+
+    async def _create(self, ticket, **params):
+        try:
+            return await self.client.chat.completions.create(**params)
+        except Exception as error:
+            if getattr(error, "status_code", None) == HTTP_429_TOO_MANY_REQUESTS:
+                ticket.throttled()
+            raise
+
+    async def _complete(self, model: str, messages: list[dict], options: dict):
+        async with llm_scheduler.slot(
+            self.provider_type, model, estimate_request_tokens(messages)
+        ) as ticket:
+            response = await self._create(
+                ticket, model=model, messages=messages, **options
+            )
+
+        usage = getattr(response, "usage", None)
+        record_usage(self.provider_type, model, usage)
+        ticket.settle(usage)
+
+        return response
+
+    async def _open_stream(self, model: str, messages: list[dict], options: dict):
+        """The opened stream, with the slot it holds until the stream ends."""
+        slot = AsyncExitStack()
+        ticket = await slot.enter_async_context(
+            llm_scheduler.slot(
+                self.provider_type, model, estimate_request_tokens(messages)
+            )
+        )
+
+        try:
+            response = await self._create(
+                ticket,
+                model=model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **options,
+            )
+        except BaseException:
+            await slot.aclose()
+            raise
+
+        return slot, ticket, response
+
+    async def complete(
+        self, model: str, messages: list[dict], prompt_cache_key: str | None = None
+    ):
+        options = {"prompt_cache_key": prompt_cache_key} if prompt_cache_key else {}
+
+        # Every attempt waits for a slot of its own
+        return await retry_call(
+            LLM_RETRY, lambda: self._complete(model, messages, options)
+        )
+
+    async def stream(
+        self, model: str, messages: list[dict], prompt_cache_key: str | None = None
+    ) -> AsyncIterator[str]:
+        """Yield the completion content deltas as they arrive."""
+        options = {"prompt_cache_key": prompt_cache_key} if prompt_cache_key else {}
+
+        # Only opening the stream is retried since the deltas can't be taken
+        # back. Every attempt waits for a slot of its own, so the backoff
+        # doesn't hold one, and the slot is kept for the whole stream
+        slot, ticket, response = await retry_call(
+            LLM_RETRY, lambda: self._open_stream(model, messages, options)
+        )
+
+        async with slot:
+            try:
+                async for chunk in response:
+                    if getattr(chunk, "usage", None) is not None:
+                        record_usage(self.provider_type, model, chunk.usage)
+                        ticket.settle(chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Stops the generation upstream when the client goes away
+                await response.close()
+
+
+class OpenRouterProvider(LLMProvider):
+    provider_type = ProvidersTypes.open_router
+
+
+class CerebrasProvider(LLMProvider):
+    provider_type = ProvidersTypes.cerebras
+
+
+PROVIDERS: dict[ProvidersTypes, type[LLMProvider]] = {
+    ProvidersTypes.open_router: OpenRouterProvider,
+    ProvidersTypes.cerebras: CerebrasProvider,
+}
+
+
+def get_llm_provider(provider_type: ProvidersTypes) -> LLMProvider:
+    provider_class = PROVIDERS.get(provider_type)
+
+    if provider_class is None:
+        raise ValueError(f"Unsupported provider type: {provider_type}")
+
+    return provider_class(get_api_key(provider_type))
@@ -0,0 +1,256 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+from collections.abc import Callable
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge
+from app.core.tracing import span
+from app.models.ai_providers import ProvidersTypes
+from app.services.llm_providers import get_llm_provider
+from app.services.llm_scheduler import SchedulerBusy
+from app.services.retry import is_retryable
+
+LLM_CALLS = Counter(
+    "llm_calls_total",
+    "Llm calls by route and outcome (ok, error, rejected or cancelled)",
+    ("provider", "model", "outcome"),
+)
+LLM_EXTRA_REQUESTS = Counter(
+    "llm_extra_requests_total",
+    "Requests sent to another route, after a slow (hedge) or failed (failover) one",
+    ("provider", "model", "reason"),
+)
+LLM_ROUTE_WINS = Counter(
+    "llm_route_wins_total",
+    "Generations answered by each route",
+    ("provider", "model"),
+)
+LLM_BREAKER_OPEN = Gauge(
+    "llm_circuit_breaker_open",
+    "1 while the circuit breaker of the provider is open",
+    ("provider",),
+)
+
+Route = tuple[ProvidersTypes, str]
+
+
+class LatencyWindow:
+    """Latencies of the last successful calls of a route."""
+
+    def __init__(self, size: int):
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        if len(self.samples) < settings.LLM_LATENCY_MIN_SAMPLES:
+            return None
+
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class CircuitBreaker:
+    """Stops sending traffic to a provider after consecutive failures.
+
+    Opens after failure_threshold failures in a row, and once reset_seconds
+    have passed lets a single probe through (half open): a success closes
+    it again, a failure keeps it open for another reset_seconds.
+    """
+
+    def __init__(self, provider_type: ProvidersTypes):
+        self.provider_type = provider_type
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= settings.LLM_BREAKER_RESET_SECONDS:
+            return "half_open"
+        return "open"
+
+    def allows(self) -> bool:
+        state = self.state()
+        return state == "closed" or (state == "half_open" and not self.probing)
+
+    def started(self):
+        if self.state() == "half_open":
+            self.probing = True
+
+    def abandoned(self):
+        self.probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        LLM_BREAKER_OPEN.set(0, provider=self.provider_type.value)
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+
+        if self.opened_at is not None or self.failures >= settings.LLM_BREAKER_FAILURES:
+            self.opened_at = time.monotonic()
+            LLM_BREAKER_OPEN.set(1, provider=self.provider_type.value)
+
+
+class LLMRouter:
+    """Sends a completion to equivalent models across providers.
+
+    The primary route goes first. When it has been silent for longer than
+    its observed p95, the next route is hedged in, and when it fails the
+    next one takes over right away. The first valid response wins and the
+    others are cancelled. Routes whose provider has an open breaker are
+    skipped.
+    """
+
+    def __init__(self):
+        self.latencies: dict[Route, LatencyWindow] = defaultdict(
+            lambda: LatencyWindow(settings.LLM_LATENCY_WINDOW)
+        )
+        self.breakers: dict[ProvidersTypes, CircuitBreaker] = {}
+
+    def breaker(self, provider_type: ProvidersTypes) -> CircuitBreaker:
+        if provider_type not in self.breakers:
+            self.breakers[provider_type] = CircuitBreaker(provider_type)
+        return self.breakers[provider_type]
+
+    def routes(self, provider_type: ProvidersTypes, model: str) -> list[Route]:
+        routes = [(provider_type, model)]
+
+        if settings.LLM_HEDGING_ENABLED:
+            equivalents = settings.LLM_EQUIVALENT_MODELS.get(model, [])
+            routes += [
+                (ProvidersTypes(equivalent_type), equivalent_model)
+                for equivalent_type, equivalent_model in equivalents
+            ]
+
+        available = [route for route in routes if self.breaker(route[0]).allows()]
+
+        # With every breaker open the primary is still tried
+        return available or routes[:1]
+
+    def hedge_delay(self, route: Route) -> float:
+        p95 = self.latencies[route].quantile(settings.LLM_HEDGE_QUANTILE)
+        if p95 is None:
+            return settings.LLM_HEDGE_DEFAULT_DELAY_SECONDS
+        return max(p95, settings.LLM_HEDGE_MIN_DELAY_SECONDS)
+
+    async def attempt(
+        self, route: Route, messages: list[dict], prompt_cache_key: str | None
+    ) -> str | None:
+        provider_type, model = route
+        breaker = self.breaker(provider_type)
+        breaker.started()
+        start = time.perf_counter()
+
+        try:
+            with span("llm_call", provider=provider_type.value, model=model):
+                response = await get_llm_provider(provider_type).complete(
+                    model, messages, prompt_cache_key
+                )
+        except asyncio.CancelledError:
+            breaker.abandoned()
+            LLM_CALLS.inc(
+                provider=provider_type.value, model=model, outcome="cancelled"
+            )
+            raise
+        except SchedulerBusy:
+            breaker.abandoned()
+            LLM_CALLS.inc(provider=provider_type.value, model=model, outcome="rejected")
+            raise
+        except Exception as error:
+            # Client errors (a bad or oversized request) say nothing about the
+            # health of the provider
+            if is_retryable(error):
+                breaker.record_failure()
+            else:
+                breaker.abandoned()
+            LLM_CALLS.inc(provider=provider_type.value, model=model, outcome="error")
+            raise
+
+        breaker.record_success()
+        LLM_CALLS.inc(provider=provider_type.value, model=model, outcome="ok")
+        self.latencies[route].observe(time.perf_counter() - start)
+
+        try:
+            return response.choices[0].message.content
+        except (AttributeError, IndexError, KeyError):
+            return None
+
+    async def complete(
+        self,
+        routes: list[Route],
+        messages: list[dict],
+        prompt_cache_key: str | None = None,
+        is_valid: Callable[[str], bool] = bool,
+    ) -> str | None:
+        """Content of the first valid response, None when none is valid.
+
+        Raises the last error when every route failed with one.
+        """
+        pending: set[asyncio.Task] = set()
+        tasks: dict[asyncio.Task, Route] = {}
+        launched = 0
+        last_error: Exception | None = None
+
+        def launch(reason: str | None = None):
+            nonlocal launched
+            route = routes[launched]
+            launched += 1
+            if reason is not None:
+                LLM_EXTRA_REQUESTS.inc(
+                    provider=route[0].value, model=route[1], reason=reason
+                )
+
+            task = asyncio.create_task(self.attempt(route, messages, prompt_cache_key))
+            tasks[task] = route
+            pending.add(task)
+
+        launch()
+
+        try:
+            while pending:
+                timeout = None
+                if launched < len(routes):
+                    timeout = self.hedge_delay(routes[launched - 1])
+
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    launch("hedge")
+                    continue
+
+                for task in done:
+                    pending.discard(task)
+
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        continue
+
+                    content = task.result()
+                    if content is not None and is_valid(content):
+                        provider_type, model = tasks[task]
+                        LLM_ROUTE_WINS.inc(provider=provider_type.value, model=model)
+                        return content
+
+                if not pending and launched < len(routes):
+                    launch("failover")
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if last_error is not None:
+            raise last_error
+
+        return None
+
+
+llm_router = LLMRouter()
@@ -0,0 +1,254 @@
+import asyncio
+import itertools
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram
+from app.models.ai_providers import ProvidersTypes
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_BACKGROUND = 2
+
+# Priority of the llm calls made from the current context, lower goes first
+llm_priority: ContextVar[int] = ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "llm_queue_wait_seconds",
+    "Time llm calls waited in the scheduler before being sent",
+    ("provider",),
+)
+LLM_QUEUE_REJECTED = Counter(
+    "llm_queue_rejected_total",
+    "Llm calls refused by the scheduler, because the queue was full or on timeout",
+    ("provider", "reason"),
+)
+LLM_QUEUE_DEPTH = Gauge("llm_queue_depth", "Llm calls waiting in the scheduler")
+LLM_IN_FLIGHT = Gauge("llm_in_flight", "Llm calls in flight", ("provider",))
+
+
+class SchedulerBusy(Exception):
+    """The call could not be scheduled: the queue is full or the wait too long."""
+
+
+class TokenBucket:
+    """Refills per_minute units per minute, holding at most a minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        # Bigger than the bucket: waits for a full one and leaves it in debt
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+    def drain(self):
+        self.tokens = min(self.tokens, 0.0)
+
+
+@dataclass(order=True)
+class Waiter:
+    priority: int
+    sequence: int
+    provider_type: ProvidersTypes = field(compare=False)
+    requests: list[TokenBucket] = field(compare=False)
+    tokens: list[TokenBucket] = field(compare=False)
+    estimated_tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class Ticket:
+    """Handed to the holder of a slot to report what the call really cost."""
+
+    def __init__(self, waiter: Waiter):
+        self.waiter = waiter
+
+    def settle(self, usage):
+        """Correct the token buckets with the usage reported by the provider."""
+        if usage is None:
+            return
+
+        actual = getattr(usage, "total_tokens", None) or (
+            (getattr(usage, "prompt_tokens", None) or 0)
+            + (getattr(usage, "completion_tokens", None) or 0)
+        )
+        for bucket in self.waiter.tokens:
+            bucket.take(actual - self.waiter.estimated_tokens)
+
+    def throttled(self):
+        """The provider answered 429: hold everything until the buckets refill."""
+        for bucket in self.waiter.requests + self.waiter.tokens:
+            bucket.drain()
+
+
+class LLMScheduler:
+    """Admission control in front of the provider calls.
+
+    Calls wait in a bounded queue until the provider has a free in-flight
+    slot (its in_flight limit, LLM_MAX_IN_FLIGHT by default) and its
+    requests/tokens per minute buckets, plus the ones of the model, have
+    room for the estimated size of the call. Waiters are served by priority
+    and then arrival; once one is held back by a bucket, later waiters
+    sharing that bucket wait behind it.
+    """
+
+    def __init__(self):
+        self.buckets: dict[tuple, TokenBucket] = {}
+        self.in_flight: dict[ProvidersTypes, int] = defaultdict(int)
+        self.waiters: list[Waiter] = []
+        self.sequence = itertools.count()
+        self.timer: asyncio.TimerHandle | None = None
+
+    def _bucket(self, key: tuple, per_minute: float | None) -> list[TokenBucket]:
+        if not per_minute:
+            return []
+        if key not in self.buckets:
+            self.buckets[key] = TokenBucket(per_minute)
+        return [self.buckets[key]]
+
+    def _limits(self, provider_type: ProvidersTypes, model: str):
+        provider_limits = settings.LLM_PROVIDER_LIMITS.get(provider_type.value, {})
+        model_limits = settings.LLM_MODEL_LIMITS.get(model, {})
+
+        requests = self._bucket(
+            ("rpm", provider_type), provider_limits.get("rpm")
+        ) + self._bucket(("rpm", provider_type, model), model_limits.get("rpm"))
+        tokens = self._bucket(
+            ("tpm", provider_type), provider_limits.get("tpm")
+        ) + self._bucket(("tpm", provider_type, model), model_limits.get("tpm"))
+
+        return requests, tokens
+
+    def _dispatch(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        now = time.monotonic()
+        next_wake = None
+        held: set[int] = set()
+
+        for waiter in sorted(self.waiters):
+            if self.in_flight[waiter.provider_type] >= max_in_flight(
+                waiter.provider_type
+            ):
+                continue
+
+            buckets = [(bucket, 1) for bucket in waiter.requests] + [
+                (bucket, waiter.estimated_tokens) for bucket in waiter.tokens
+            ]
+            if any(id(bucket) in held for bucket, _ in buckets):
+                continue
+
+            wait = max(
+                (bucket.wait_time(amount, now) for bucket, amount in buckets),
+                default=0.0,
+            )
+            if wait > 0:
+                held.update(id(bucket) for bucket, _ in buckets)
+                next_wake = wait if next_wake is None else min(next_wake, wait)
+                continue
+
+            for bucket, amount in buckets:
+                bucket.take(amount)
+            self.in_flight[waiter.provider_type] += 1
+            self.waiters.remove(waiter)
+            waiter.future.set_result(None)
+
+        LLM_QUEUE_DEPTH.set(len(self.waiters))
+        for provider_type, in_flight in self.in_flight.items():
+            LLM_IN_FLIGHT.set(in_flight, provider=provider_type.value)
+
+        if next_wake is not None:
+            self.timer = asyncio.get_running_loop().call_later(
+                next_wake, self._dispatch
+            )
+
+    def _release(self, provider_type: ProvidersTypes):
+        self.in_flight[provider_type] -= 1
+        self._dispatch()
+
+    def _withdraw(self, waiter: Waiter):
+        self.waiters.remove(waiter)
+        waiter.future.cancel()
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(
+        self, provider_type: ProvidersTypes, model: str, estimated_tokens: int
+    ):
+        if len(self.waiters) >= settings.LLM_QUEUE_SIZE:
+            LLM_QUEUE_REJECTED.inc(provider=provider_type.value, reason="queue_full")
+            raise SchedulerBusy("Too many llm calls waiting")
+
+        requests, tokens = self._limits(provider_type, model)
+        waiter = Waiter(
+            llm_priority.get(),
+            next(self.sequence),
+            provider_type,
+            requests,
+            tokens,
+            estimated_tokens,
+            asyncio.get_running_loop().create_future(),
+        )
+        self.waiters.append(waiter)
+        self._dispatch()
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(waiter.future), settings.LLM_QUEUE_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            if not waiter.future.done():
+                self._withdraw(waiter)
+                LLM_QUEUE_REJECTED.inc(provider=provider_type.value, reason="timeout")
+                raise SchedulerBusy("Timed out waiting for the llm provider")
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                self._release(provider_type)
+            else:
+                self._withdraw(waiter)
+            raise
+
+        LLM_QUEUE_WAIT_SECONDS.observe(
+            time.perf_counter() - start, provider=provider_type.value
+        )
+
+        try:
+            yield Ticket(waiter)
+        finally:
+            self._release(provider_type)
+
+
+def max_in_flight(provider_type: ProvidersTypes) -> int:
+    provider_limits = settings.LLM_PROVIDER_LIMITS.get(provider_type.value, {})
+
+    return int(provider_limits.get("in_flight") or settings.LLM_MAX_IN_FLIGHT)
+
+
+def estimate_request_tokens(messages: list[dict]) -> int:
+    characters = sum(len(message.get("content") or "") for message in messages)
+
+    return (
+        int(characters / settings.DIFF_CHARS_PER_TOKEN)
+        + settings.LLM_EXPECTED_COMPLETION_TOKENS
+    )
+
+
+llm_scheduler = LLMScheduler()
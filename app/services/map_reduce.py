@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+from app.core.config import settings
+from app.models.ai_providers import ProvidersTypes
+from app.services.diff_packer import (
+    FILE_OVERHEAD_TOKENS,
+    encoded_tokens,
+    estimate_tokens,
+    hunk_tokens,
+    pack_diffs,
+)
+from app.services.llm_router import llm_router
+from app.services.payload_encoders import PayloadEncoder
+from app.services.prompts import MAP_SYSTEM_PROMPT, request_block
+
+
+def file_tokens(file: dict, encoder: PayloadEncoder) -> int:
+    return (
+        FILE_OVERHEAD_TOKENS
+        + encoded_tokens(file["path"], encoder)
+        + sum(hunk_tokens(hunk, encoder) for hunk in file["hunks"])
+    )
+
+
+def chunk_files(
+    optimized_diffs: dict, token_budget: int, encoder: PayloadEncoder
+) -> list[list[dict]]:
+    """Group the changed files in chunks of about token_budget tokens."""
+    chunks = [[]]
+    used = 0
+
+    for file in optimized_diffs["files_changed"]:
+        cost = file_tokens(file, encoder)
+
+        if chunks[-1] and used + cost > token_budget:
+            chunks.append([])
+            used = 0
+
+        chunks[-1].append(file)
+        used += cost
+
+    # Past the limit the files of the extra chunks get packed into the last one
+    if len(chunks) > settings.MAP_REDUCE_MAX_CHUNKS:
+        limit = settings.MAP_REDUCE_MAX_CHUNKS
+        chunks = chunks[: limit - 1] + [sum(chunks[limit - 1 :], [])]
+
+    return chunks
+
+
+async def summarize_chunk(
+    provider_type: ProvidersTypes,
+    model: str,
+    semaphore: asyncio.Semaphore,
+    diff_text: str,
+    part: int,
+    parts: int,
+    user_context: str,
+) -> str:
+    messages = [
+        {"role": "system", "content": MAP_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": f"PART {part} OF {parts}\n\n"
+            + request_block(diff_text, user_context),
+        },
+    ]
+
+    # Through the router, so chunks get the breaker and failover too
+    async with semaphore:
+        summary = await llm_router.complete(
+            llm_router.routes(provider_type, model), messages
+        )
+
+    return summary or ""
+
+
+async def map_reduce_diffs(
+    optimized_diffs: dict,
+    chunks: list[list[dict]],
+    token_budget: int,
+    provider_type: ProvidersTypes,
+    model: str,
+    user_context: str,
+    encoder: PayloadEncoder,
+) -> dict:
+    """Summarize the diff chunks made by chunk_files, for changes too big for one prompt.
+
+    The chunks are summarized concurrently, at most
+    MAP_REDUCE_CONCURRENCY at a time. Returns the payload for the final
+    title/description prompt: the commits, the list of changed files and the
+    summary of every chunk.
+    """
+    semaphore = asyncio.Semaphore(settings.MAP_REDUCE_CONCURRENCY)
+
+    summaries = await asyncio.gather(
+        *[
+            summarize_chunk(
+                provider_type,
+                model,
+                semaphore,
+                encoder.encode(
+                    pack_diffs(
+                        {
+                            "commits": [],
+                            "files_changed": files,
+                            "total_commits": optimized_diffs["total_commits"],
+                            "total_files": len(files),
+                        },
+                        token_budget,
+                        encoder,
+                    )
+                ),
+                part,
+                len(chunks),
+                user_context,
+            )
+            for part, files in enumerate(chunks, start=1)
+        ]
+    )
+
+    remaining = token_budget - sum(
+        encoded_tokens(summary, encoder) for summary in summaries
+    )
+    remaining -= estimate_tokens(json.dumps(optimized_diffs["commits"]))
+    files_changed = []
+
+    for file in optimized_diffs["files_changed"]:
+        entry = {
+            "path": file["path"],
+            "status": file["status"],
+            "additions": file["additions"],
+            "deletions": file["deletions"],
+        }
+        if file.get("summary"):
+            entry["summary"] = file["summary"]
+        remaining -= FILE_OVERHEAD_TOKENS + encoded_tokens(file["path"], encoder)
+        if remaining < 0:
+            break
+        files_changed.append(entry)
+
+    return {
+        "commits": optimized_diffs["commits"],
+        "files_changed": files_changed,
+        "change_summaries": summaries,
+        "total_commits": optimized_diffs["total_commits"],
+        "total_files": optimized_diffs["total_files"],
+    }
@@ -0,0 +1,88 @@
+TITLE_START = "[title:start]"
+TITLE_END = "[title:end]"
+DESCRIPTION_START = "[description:start]"
+DESCRIPTION_END = "[description:end]"
+
+
+def extract_section(text, start_tag, end_tag):
+    """Extract text between two markers safely using split."""
+    try:
+        return text.split(start_tag, 1)[1].split(end_tag, 1)[0].strip()
+    except IndexError:
+        return None  # In case tags are missing
+
+
+def _partial_tag_length(text: str, tag: str) -> int:
+    """Length of the longest suffix of text that is a prefix of tag."""
+    for length in range(min(len(tag) - 1, len(text)), 0, -1):
+        if tag.startswith(text[-length:]):
+            return length
+    return 0
+
+
+class MergeRequestStreamParser:
+    """Incrementally parses the tagged title/description output of the llm.
+
+    feed() receives the completion deltas as they arrive and returns the
+    events that can already be emitted: ("title", text) once the title is
+    closed and ("description", text) for every new piece of description.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.title: str | None = None
+        self.description = ""
+        self._state = "title"
+        self._cursor = 0
+
+    def feed(self, delta: str) -> list[tuple[str, str]]:
+        self.text += delta
+        events = []
+
+        if self._state == "title":
+            end = self.text.find(TITLE_END)
+            if end == -1:
+                return events
+
+            self.title = extract_section(self.text, TITLE_START, TITLE_END) or ""
+            events.append(("title", self.title))
+            self._cursor = end + len(TITLE_END)
+            self._state = "before_description"
+
+        if self._state == "before_description":
+            start = self.text.find(DESCRIPTION_START, self._cursor)
+            if start == -1:
+                return events
+
+            self._cursor = start + len(DESCRIPTION_START)
+            self._state = "description"
+
+        if self._state == "description":
+            pending = self.text[self._cursor :]
+            end = pending.find(DESCRIPTION_END)
+
+            if end != -1:
+                chunk = pending[:end].rstrip()
+                self._state = "done"
+            else:
+                # Hold back whitespace and anything that may become the end tag
+                chunk = pending[: len(pending) - _partial_tag_length(pending, DESCRIPTION_END)]
+                chunk = chunk.rstrip()
+
+            if not self.description:
+                chunk = chunk.lstrip()
+                self._cursor = len(self.text) - len(pending.lstrip())
+
+            if chunk:
+                self.description += chunk
+                self._cursor += len(chunk)
+                events.append(("description", chunk))
+
+        return events
+
+    def result(self) -> tuple[str | None, str | None]:
+        """Title and description parsed from the whole completion."""
+        return (
+            extract_section(self.text, TITLE_START, TITLE_END),
+            extract_section(self.text, DESCRIPTION_START, DESCRIPTION_END),
+        )
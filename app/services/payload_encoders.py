@@ -0,0 +1,95 @@
+import json
+from abc import ABC, abstractmethod
+
+from app.core.config import settings
+from app.models.ai_models import PayloadEncodings
+
+STATUS_CODES = {"new": "A", "deleted": "D", "modified": "M"}
+
+
+class PayloadEncoder(ABC):
+    """Turns the diff payload into the DIFF_TEXT sent to the model."""
+
+    name: PayloadEncodings
+
+    @abstractmethod
+    def encode(self, payload: dict) -> str:
+        pass
+
+    def text_length(self, text: str) -> int:
+        """Characters text takes once encoded in the payload."""
+        return len(text)
+
+
+class JsonEncoder(PayloadEncoder):
+    name = PayloadEncodings.json
+
+    def encode(self, payload: dict) -> str:
+        return json.dumps(payload)
+
+    def text_length(self, text: str) -> int:
+        # Escaped newlines, quotes and non ascii characters, without the quotes
+        return len(json.dumps(text)) - 2
+
+
+class CompactEncoder(PayloadEncoder):
+    """Line oriented format: one header line per file followed by its raw hunks.
+
+    Avoids repeating the keys of every file and escaping the newlines and
+    quotes of the diffs, which makes up most of the JSON tokens.
+    """
+
+    name = PayloadEncodings.compact
+
+    def encode(self, payload: dict) -> str:
+        out = [f"COMMITS ({payload['total_commits']}):"]
+
+        for commit in payload["commits"]:
+            message = commit["message"].strip().replace("\n", "\n  ")
+            out.append(f"- {commit['timestamp']} {commit['author']}: {message}")
+
+        out.append(f"FILES ({payload['total_files']}):")
+
+        for file in payload["files_changed"]:
+            header = f"=== {STATUS_CODES.get(file['status'], 'M')} {file['path']} "
+            if file.get("summary"):
+                header += f"[{file['summary']}]"
+            else:
+                header += f"(+{file['additions']} -{file['deletions']})"
+            if file.get("omitted_hunks"):
+                header += f" [{file['omitted_hunks']} hunks omitted]"
+            out.append(header)
+
+            if file.get("diff"):
+                out.append(file["diff"])
+
+        if payload.get("change_summaries"):
+            out.append("CHANGE SUMMARIES:")
+            out.extend(payload["change_summaries"])
+
+        omitted = payload.get("omitted")
+        if omitted:
+            out.append(
+                f"OMITTED: {omitted['hunks']} hunks, "
+                f"{omitted['unlisted_files']} unlisted files"
+            )
+            if omitted["files_without_diff"]:
+                out.append(
+                    "FILES WITHOUT DIFF: " + ", ".join(omitted["files_without_diff"])
+                )
+
+        return "\n".join(out)
+
+
+ENCODERS: dict[PayloadEncodings, PayloadEncoder] = {
+    encoder.name: encoder for encoder in (JsonEncoder(), CompactEncoder())
+}
+
+
+def get_payload_encoder(encoding: PayloadEncodings | None) -> PayloadEncoder:
+    encoding = encoding or PayloadEncodings(settings.DEFAULT_PAYLOAD_ENCODING)
+
+    if encoding not in ENCODERS:
+        raise ValueError(f"Unsupported payload encoding: {encoding}")
+
+    return ENCODERS[encoding]
@@ -0,0 +1,132 @@
+import asyncio
+import datetime
+import random
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from app.core.metrics import Counter
+
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+RETRIES = Counter(
+    "outbound_retries_total",
+    "Outbound calls retried, by target and reason",
+    ("target", "reason"),
+)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by an overall deadline.
+
+    A Retry-After sent by the server replaces the backoff, but is still
+    bounded by the deadline: when the next attempt could not start before
+    it, the last error is raised right away.
+    """
+
+    target: str
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+    deadline: float
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+def status_code_of(error: Exception) -> int | None:
+    return getattr(error, "status_code", None)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max((retry_at - now).total_seconds(), 0.0)
+
+
+def retry_after_of(error: Exception) -> float | None:
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return retry_after
+
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        return None
+
+    return parse_retry_after(headers.get("retry-after"))
+
+
+def transport_error_of(error: BaseException) -> httpx.TransportError | None:
+    while error is not None:
+        if isinstance(error, httpx.TransportError):
+            return error
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, dropped connections, rate limits and server errors."""
+    status_code = status_code_of(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+
+    return transport_error_of(error) is not None
+
+
+def is_retryable_unsent(error: Exception) -> bool:
+    """For calls that are not idempotent: only when nothing was processed."""
+    if status_code_of(error) == 429:
+        return True
+
+    return isinstance(
+        transport_error_of(error), (httpx.ConnectError, httpx.ConnectTimeout)
+    )
+
+
+def retry_reason(error: Exception) -> str:
+    status_code = status_code_of(error)
+    return str(status_code) if status_code is not None else type(error).__name__
+
+
+async def retry_call(
+    policy: RetryPolicy,
+    call: Callable[[], Awaitable],
+    retryable: Callable[[Exception], bool] = is_retryable,
+):
+    """Run call, retrying retryable errors as the policy allows."""
+    deadline = time.monotonic() + policy.deadline
+    attempt = 0
+
+    while True:
+        try:
+            return await call()
+        except Exception as error:
+            attempt += 1
+            if attempt >= policy.max_attempts or not retryable(error):
+                raise
+
+            retry_after = retry_after_of(error)
+            delay = policy.backoff(attempt - 1) if retry_after is None else retry_after
+
+            if time.monotonic() + delay >= deadline:
+                raise
+
+            RETRIES.inc(target=policy.target, reason=retry_reason(error))
+            await asyncio.sleep(delay)
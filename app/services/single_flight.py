@@ -0,0 +1,65 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+
+from app.core.metrics import Counter
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "single_flight_calls_total",
+    "Calls through a single-flight group, by whether they ran or joined the work",
+    ("group", "role"),
+)
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution of the work.
+
+    The first caller (the leader) starts the work, callers arriving while it
+    runs are coalesced onto it and get the same result or exception. The
+    work is cancelled once every caller waiting for it went away. Nothing
+    is kept once it finishes, caching is left to the caller.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._running: dict[Hashable, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable]):
+        task = self._running.get(key)
+
+        if task is None:
+            SINGLE_FLIGHT_CALLS.inc(group=self.name, role="leader")
+            # A task of its own so a cancelled caller doesn't fail the others
+            task = asyncio.create_task(work())
+            task.add_done_callback(_consume_exception)
+            task.add_done_callback(lambda _: self._forget(key, task))
+            self._running[key] = task
+        else:
+            SINGLE_FLIGHT_CALLS.inc(group=self.name, role="coalesced")
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # Nobody wants the result anymore, later callers start over
+                    self._forget(key, task)
+                    task.cancel()
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._running.get(key) is task:
+            del self._running[key]
+
+    def counts(self) -> dict:
+        return {
+            role: SINGLE_FLIGHT_CALLS.value(group=self.name, role=role)
+            for role in ("leader", "coalesced")
+        }
+
+
+def _consume_exception(task: asyncio.Task):
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,72 @@
+"""Micro-benchmark of the diff processing done for every changed file.
+
+Compares the previous approach (two `.count()` scans plus a split for the
+truncation) against the single-pass parser on a synthetic 50k-line diff.
+
+    python -m benchmarks.bench_diff_parser
+"""
+
+import random
+import timeit
+
+from app.services.diff_parser import parse_diff
+
+LINES = 50_000
+HUNK_LINES = 100
+
+
+def synthetic_diff(lines: int = LINES, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    out = []
+    line_number = 1
+
+    for _ in range(lines // HUNK_LINES):
+        body = []
+        old = new = 0
+        for _ in range(HUNK_LINES - 1):
+            kind = rng.choices(" +-", weights=(6, 2, 2))[0]
+            body.append(
+                f"{kind}    value_{rng.randrange(10**6)} = compute(x, y)  # note"
+            )
+            old += kind != "+"
+            new += kind != "-"
+        out.append(f"@@ -{line_number},{old} +{line_number},{new} @@ def handler():")
+        out.extend(body)
+        line_number += old
+
+    return "\n".join(out) + "\n"
+
+
+def legacy(diff_text: str):
+    additions = diff_text.count("\n+")
+    deletions = diff_text.count("\n-")
+    lines = diff_text.split("\n")
+    truncated = "\n".join(lines[:25] + lines[-25:])
+    return additions, deletions, truncated
+
+
+def single_pass(diff_text: str):
+    parsed = parse_diff(diff_text)
+    return parsed.additions, parsed.deletions, parsed.hunks
+
+
+def main():
+    diff_text = synthetic_diff()
+    print(f"diff: {LINES} lines, {len(diff_text) / 1024:.0f} KiB")
+
+    for name, function in (("legacy", legacy), ("single_pass", single_pass)):
+        runs = 20
+        seconds = min(timeit.repeat(lambda: function(diff_text), number=runs, repeat=3))
+        print(f"{name:>12}: {seconds / runs * 1000:8.2f} ms per diff")
+
+    legacy_stats = legacy(diff_text)[:2]
+    parsed = parse_diff(diff_text)
+    print(f"legacy stats: +{legacy_stats[0]} -{legacy_stats[1]}")
+    print(
+        f"parsed stats: +{parsed.additions} -{parsed.deletions} "
+        f"in {len(parsed.hunks)} hunks"
+    )
+
+
+if __name__ == "__main__":
+    main()
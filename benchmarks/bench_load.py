@@ -0,0 +1,344 @@
+"""End-to-end load test of POST /api/v1/merge-request on fake upstreams.
+
+Starts the fake GitLab and llm servers of benchmarks.fake_servers, runs the
+app under uvicorn pointed at them through GITLAB_URL, OPEN_ROUTER_BASE_URL
+and CEREBRAS_BASE_URL, seeds a provider, model and template through the
+api and sends generations at a fixed concurrency. Reports latency
+percentiles, requests per second, the Server-Timing breakdown and the
+resident memory of every app worker (only when the harness started it).
+
+The app still needs its database: DSN must point at a migrated Postgres.
+Every request uses its own branch, so nothing is served from the caches,
+unless --same-branch is given.
+
+    python -m benchmarks.bench_load --concurrency 32 --requests 500
+    python -m benchmarks.bench_load --workers 4 --files 50 --ttft 1 --tokens-per-second 80
+    python -m benchmarks.bench_load --app-url http://localhost:8000 --duration 60 \\
+        --provider-id 1 --model bench-model --template-id 1
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+API = "/api/v1"
+
+
+def start_process(args: list[str], env: dict | None = None) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args], env={**os.environ, **(env or {})}, cwd=os.getcwd()
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.get(url)
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up in {timeout:.0f}s")
+            await asyncio.sleep(0.2)
+
+
+def start_servers(args) -> tuple[list[subprocess.Popen], str]:
+    gitlab_url = f"http://127.0.0.1:{args.port + 1}"
+    llm_url = f"http://127.0.0.1:{args.port + 2}"
+    processes = [
+        start_process(
+            [
+                "-m",
+                "benchmarks.fake_servers",
+                "gitlab",
+                "--port",
+                str(args.port + 1),
+                "--files",
+                str(args.files),
+                "--lines-per-file",
+                str(args.lines_per_file),
+                "--latency",
+                str(args.gitlab_latency),
+            ]
+        ),
+        start_process(
+            [
+                "-m",
+                "benchmarks.fake_servers",
+                "llm",
+                "--port",
+                str(args.port + 2),
+                "--ttft",
+                str(args.ttft),
+                "--tokens-per-second",
+                str(args.tokens_per_second),
+                "--completion-tokens",
+                str(args.completion_tokens),
+            ]
+        ),
+        start_process(
+            [
+                "-m",
+                "uvicorn",
+                "app.main:app",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(args.port),
+                "--workers",
+                str(args.workers),
+                "--log-level",
+                "warning",
+            ],
+            {
+                "GITLAB_URL": gitlab_url,
+                "OPEN_ROUTER_BASE_URL": f"{llm_url}/v1",
+                "CEREBRAS_BASE_URL": llm_url,
+                "OPEN_ROUTER_API_KEY": "bench",
+                "CEREBRAS_API_KEY": "bench",
+                "JOB_WORKERS": "0",
+            },
+        ),
+    ]
+
+    return processes, f"http://127.0.0.1:{args.port}"
+
+
+async def seed(client: httpx.AsyncClient, args):
+    """Provider, model and template to generate with, unless given."""
+    if args.provider_id and args.model and args.template_id:
+        return
+
+    response = await client.post(
+        f"{API}/ai-provider", json={"name": f"bench-{args.run}", "type": "OPEN_ROUTER"}
+    )
+    response.raise_for_status()
+    args.provider_id = response.json()["id"]
+
+    response = await client.post(
+        f"{API}/ai-model",
+        json={"provider_id": args.provider_id, "name": f"bench-model-{args.run}"},
+    )
+    response.raise_for_status()
+    args.model = response.json()["name"]
+
+    response = await client.post(
+        f"{API}/templates",
+        json={
+            "title": f"bench-{args.run}",
+            "template": "## Summary\n\n## Changes\n",
+            "description": "Load test template",
+        },
+    )
+    response.raise_for_status()
+    args.template_id = response.json()["id"]
+
+
+def worker_pids(pid: int) -> list[int]:
+    """The uvicorn workers, or the process itself when it has none."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as file:
+            children = [int(child) for child in file.read().split()]
+    except OSError:
+        return [pid]
+
+    # With --workers > 1 the multiprocessing resource tracker is a child too
+    return [child for child in children if not is_resource_tracker(child)] or [pid]
+
+
+def is_resource_tracker(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as file:
+            return b"resource_tracker" in file.read()
+    except OSError:
+        return False
+
+
+def rss_mib(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def parse_server_timing(value: str | None) -> dict[str, float]:
+    timings = {}
+    for entry in (value or "").split(","):
+        name, *params = entry.strip().split(";")
+        for param in params:
+            if param.startswith("dur="):
+                timings[name] = float(param[4:])
+    return timings
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+async def drive(
+    client: httpx.AsyncClient, args, phase: str, requests: int, duration: float
+):
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    stages: dict[str, list[float]] = defaultdict(list)
+    sequence = itertools.count()
+    deadline = time.monotonic() + duration if duration else None
+
+    def payload(index: int) -> dict:
+        return {
+            "project_id": 1,
+            "origin_branch": (
+                "bench" if args.same_branch else f"{phase}-{args.run}-{index}"
+            ),
+            "target_branch": "main",
+            "context_ai": "",
+            "pat": "bench-token-0000",
+            "template_id": args.template_id,
+            "provider_id": args.provider_id,
+            "model": args.model,
+        }
+
+    async def worker():
+        for index in sequence:
+            if requests and index >= requests:
+                return
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+
+            start = time.perf_counter()
+            try:
+                response = await client.post(
+                    f"{API}/merge-request", json=payload(index)
+                )
+                statuses[response.status_code] += 1
+                timings = parse_server_timing(response.headers.get("server-timing"))
+                for name, milliseconds in timings.items():
+                    stages[name].append(milliseconds)
+            except httpx.HTTPError as error:
+                statuses[type(error).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return latencies, statuses, stages, elapsed
+
+
+def report(latencies, statuses, stages, elapsed, memory):
+    print(f"\nrequests: {len(latencies)} in {elapsed:.1f}s")
+    print(f"  throughput: {len(latencies) / elapsed:.1f} req/s")
+    print("  status: " + ", ".join(f"{key}={count}" for key, count in statuses.items()))
+
+    if latencies:
+        print(
+            "  latency: "
+            + "  ".join(
+                f"{name} {percentile(latencies, q) * 1000:.0f}ms"
+                for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+            )
+            + f"  max {max(latencies) * 1000:.0f}ms"
+        )
+
+    if stages:
+        print("\nserver timing (mean / p95 per request):")
+        for name, values in sorted(stages.items(), key=lambda item: -sum(item[1])):
+            print(
+                f"  {name:>22}: {sum(values) / len(values):>8.1f}ms "
+                f"{percentile(values, 0.95):>8.1f}ms"
+            )
+
+    if memory:
+        print("\nworker memory (rss before -> after):")
+        for pid, (before, after) in memory.items():
+            print(f"  pid {pid}: {before:.0f} MiB -> {after:.0f} MiB")
+
+
+async def run(args):
+    processes: list[subprocess.Popen] = []
+    url = args.app_url
+
+    try:
+        if url is None:
+            processes, url = start_servers(args)
+
+        async with httpx.AsyncClient(
+            base_url=url,
+            timeout=args.timeout,
+            limits=httpx.Limits(max_connections=args.concurrency),
+        ) as client:
+            await wait_ready(client, "/")
+            await seed(client, args)
+
+            pids = worker_pids(processes[-1].pid) if processes else []
+
+            if args.warmup:
+                await drive(client, args, "warmup", args.warmup, 0)
+
+            before = {pid: rss_mib(pid) for pid in pids}
+            results = await drive(client, args, "bench", args.requests, args.duration)
+            memory = {pid: (before[pid], rss_mib(pid)) for pid in pids}
+
+        print(
+            f"concurrency {args.concurrency}, workers {args.workers}, "
+            f"{args.files} files x {args.lines_per_file} lines, "
+            f"ttft {args.ttft}s, {args.tokens_per_second} tokens/s"
+        )
+        report(*results, memory)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--duration", type=float, default=0, help="Seconds, instead of --requests"
+    )
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--same-branch", action="store_true")
+
+    parser.add_argument("--app-url", help="Use a running app instead of starting one")
+    parser.add_argument("--port", type=int, default=8800, help="App, then the fakes")
+    parser.add_argument("--workers", type=int, default=1)
+
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--lines-per-file", type=int, default=200)
+    parser.add_argument("--gitlab-latency", type=float, default=0.05)
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+
+    parser.add_argument("--provider-id", type=int)
+    parser.add_argument("--model")
+    parser.add_argument("--template-id", type=int)
+    args = parser.parse_args()
+
+    if args.duration:
+        args.requests = 0
+    # Branches and catalog rows unique to this run, so a long running app
+    # does not answer from its caches
+    args.run = f"{int(time.time())}-{os.getpid()}"
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
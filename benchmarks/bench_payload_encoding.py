@@ -0,0 +1,124 @@
+"""Size of the DIFF_TEXT sent to the model with every payload encoding.
+
+Builds GitLab compare responses from real git history (by default the
+history of this repository) or loads saved ones, runs them through the
+usual diff pipeline and reports bytes and estimated tokens per encoder.
+Token counts use tiktoken when it is installed and chars / 4 otherwise.
+
+    python -m benchmarks.bench_payload_encoding
+    python -m benchmarks.bench_payload_encoding --repo ../other --range v1.0..v1.1
+    python -m benchmarks.bench_payload_encoding --fixture compare.json
+"""
+
+import argparse
+import json
+import subprocess
+
+from app.services.generation import build_optimized_diffs
+from app.services.diff_packer import pack_diffs
+from app.services.payload_encoders import ENCODERS, get_payload_encoder
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text))
+
+    TOKENIZER = "cl100k_base"
+# Not installed, or the encoding can't be downloaded
+except Exception:
+
+    def count_tokens(text: str) -> int:
+        return len(text) // 4
+
+    TOKENIZER = "chars/4"
+
+
+def git(repo: str, *args: str) -> str:
+    return subprocess.run(
+        ["git", "-C", repo, *args], capture_output=True, text=True, check=True
+    ).stdout
+
+
+def compare_from_git(repo: str, base: str, head: str) -> dict:
+    """Same shape as GitLab's repository/compare response."""
+    commits = []
+    log = git(repo, "log", "--format=%an%x00%aI%x00%B%x1e", f"{base}..{head}")
+    for entry in log.split("\x1e"):
+        if entry.strip():
+            author, created_at, message = entry.strip("\n").split("\x00", 2)
+            commits.append(
+                {"author_name": author, "created_at": created_at, "message": message}
+            )
+
+    diffs = []
+    for file_diff in git(repo, "diff", "--no-color", base, head).split("diff --git ")[
+        1:
+    ]:
+        header, _, body = file_diff.partition("\n@@")
+        path = header.split("\n", 1)[0].split(" b/", 1)[-1]
+        diffs.append(
+            {
+                "new_path": path,
+                "new_file": "\nnew file mode" in header,
+                "deleted_file": "\ndeleted file mode" in header,
+                "diff": "@@" + body if body else "",
+            }
+        )
+
+    return {"commits": commits, "diffs": diffs}
+
+
+def default_ranges(repo: str) -> list[str]:
+    root = git(repo, "rev-list", "--max-parents=0", "HEAD").split()[0]
+    count = int(git(repo, "rev-list", "--count", "HEAD"))
+    ranges = [f"{root}..HEAD"]
+    if count > 5:
+        ranges.append("HEAD~5..HEAD")
+    if count > 1:
+        ranges.append("HEAD~1..HEAD")
+    return ranges
+
+
+def report(name: str, compare: dict):
+    # Nothing is dropped with this budget, whatever the encoder
+    payload = pack_diffs(
+        build_optimized_diffs(compare), 10**9, get_payload_encoder(None)
+    )
+    print(f"\n{name}: {len(compare['diffs'])} files, {len(compare['commits'])} commits")
+
+    baseline = None
+    for encoder in ENCODERS.values():
+        text = encoder.encode(payload)
+        size = len(text.encode())
+        tokens = count_tokens(text)
+        baseline = baseline or tokens
+        print(
+            f"  {encoder.name.value:>8}: {size:>9} bytes {tokens:>8} tokens "
+            f"({tokens / baseline:.0%} of json)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repo", default=".")
+    parser.add_argument("--range", action="append", dest="ranges")
+    parser.add_argument("--fixture", action="append", default=[])
+    args = parser.parse_args()
+
+    print(f"tokenizer: {TOKENIZER}")
+
+    for fixture in args.fixture:
+        with open(fixture) as file:
+            report(fixture, json.load(file))
+
+    if not args.fixture or args.ranges:
+        for git_range in args.ranges or default_ranges(args.repo):
+            base, head = git_range.split("..")
+            report(git_range, compare_from_git(args.repo, base, head))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Stand-ins for GitLab and an OpenAI compatible chat api, for load tests.
+
+They answer just enough of both apis for a generation, with configurable
+sizes and latencies, so the service can be driven end to end offline.
+Responses are built once at startup so the fakes are never the bottleneck.
+
+    python -m benchmarks.fake_servers gitlab --port 9001 --files 20 --latency 0.05
+    python -m benchmarks.fake_servers llm --port 9002 --ttft 0.5 --tokens-per-second 200
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+
+import uvicorn
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import Response, StreamingResponse
+
+from app.services.mr_output import (
+    DESCRIPTION_END,
+    DESCRIPTION_START,
+    TITLE_END,
+    TITLE_START,
+)
+from benchmarks.bench_diff_parser import HUNK_LINES, synthetic_diff
+
+
+def fake_gitlab(
+    files: int = 20,
+    lines_per_file: int = 200,
+    latency: float = 0.05,
+    compare_latency: float | None = None,
+) -> FastAPI:
+    """Projects, branches and compare endpoints of the GitLab v4 api.
+
+    Branch heads are derived from the branch name, so distinct branches
+    miss the compare and generation caches and equal ones hit them.
+    """
+    app = FastAPI()
+    compare_body = json.dumps(
+        {
+            "commits": [
+                {
+                    "author_name": "Bench",
+                    "created_at": "2024-01-01T00:00:00Z",
+                    "message": f"Change module {index}",
+                }
+                for index in range(max(files // 4, 1))
+            ],
+            "diffs": [
+                {
+                    "old_path": f"src/module_{index}.py",
+                    "new_path": f"src/module_{index}.py",
+                    "new_file": False,
+                    "deleted_file": False,
+                    "renamed_file": False,
+                    "diff": synthetic_diff(max(lines_per_file, HUNK_LINES), index),
+                }
+                for index in range(files)
+            ],
+        }
+    ).encode()
+
+    @app.get("/api/v4/projects/{project_id}")
+    async def get_project(project_id: int):
+        await asyncio.sleep(latency)
+        return {
+            "id": project_id,
+            "name": f"project-{project_id}",
+            "path_with_namespace": f"bench/project-{project_id}",
+            "default_branch": "main",
+        }
+
+    @app.get("/api/v4/projects/{project_id}/repository/branches/{branch:path}")
+    async def get_branch(project_id: int, branch: str):
+        await asyncio.sleep(latency)
+        sha = hashlib.sha1(f"{project_id}:{branch}".encode()).hexdigest()
+        return {"name": branch, "commit": {"id": sha}}
+
+    @app.get("/api/v4/projects/{project_id}/repository/compare")
+    async def compare(
+        project_id: int, from_ref: str = Query(alias="from"), to: str = Query()
+    ):
+        await asyncio.sleep(latency if compare_latency is None else compare_latency)
+        return Response(compare_body, media_type="application/json")
+
+    return app
+
+
+def completion_text(tokens: int) -> str:
+    """A valid merge request answer of roughly tokens tokens."""
+    words = " ".join(f"word{index % 50}" for index in range(max(tokens - 10, 1)))
+    return (
+        f"{TITLE_START}Bench merge request{TITLE_END}\n"
+        f"{DESCRIPTION_START}\n{words}\n{DESCRIPTION_END}"
+    )
+
+
+def fake_llm(
+    ttft: float = 0.3, tokens_per_second: float = 100.0, completion_tokens: int = 200
+) -> FastAPI:
+    """Chat completions, plain and streamed, at a fixed generation speed.
+
+    Served under /v1, the base url of both sdk clients once the host is
+    swapped: OPEN_ROUTER_BASE_URL=http://host/v1, CEREBRAS_BASE_URL=http://host
+    """
+    app = FastAPI()
+    content = completion_text(completion_tokens)
+    pieces = [word + " " for word in content.split(" ")]
+    token_delay = 1 / tokens_per_second
+
+    def usage(body: dict) -> dict:
+        prompt_chars = sum(
+            len(message.get("content") or "") for message in body["messages"]
+        )
+        return {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_chars // 4 + completion_tokens,
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        created = int(time.time())
+        base = {"id": "chatcmpl-bench", "created": created, "model": body["model"]}
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + completion_tokens * token_delay)
+            return {
+                **base,
+                "object": "chat.completion",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage(body),
+            }
+
+        async def events():
+            await asyncio.sleep(ttft)
+            for piece in pieces:
+                chunk = {
+                    **base,
+                    "object": "chat.completion.chunk",
+                    "choices": [
+                        {"index": 0, "delta": {"content": piece}, "finish_reason": None}
+                    ],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(token_delay)
+
+            final = {
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [],
+                "usage": usage(body),
+            }
+            yield f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("server", choices=("gitlab", "llm"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--lines-per-file", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--compare-latency", type=float)
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.server == "gitlab":
+        app = fake_gitlab(
+            args.files, args.lines_per_file, args.latency, args.compare_latency
+        )
+    else:
+        app = fake_llm(args.ttft, args.tokens_per_second, args.completion_tokens)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()